@@ -81,3 +81,6 @@ if redis_location:
         },
     }
     CACHE_MIDDLEWARE_SECONDS = int(os.getenv("FOLIOBLOG_CACHE_MIDDLEWARE_SECONDS", 86400))
+    FOLIOBLOG_CACHE_STALE_SECONDS = int(os.getenv("FOLIOBLOG_CACHE_STALE_SECONDS", 0))
+    FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES", 0))
+    FOLIOBLOG_CACHE_WARMUP_QUEUE = eval(os.getenv("FOLIOBLOG_CACHE_WARMUP_QUEUE", "False"))
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_alter_blogpage_date"),
+        ("core", "0022_imageusage"),
+        ("wagtailcore", "0093_uploadedfile"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="blogpage",
+            index=models.Index(fields=["-date", "-page_ptr"], name="blog_blogpage_keyset_idx"),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils.translation import get_language
 
 from wagtail.admin.panels import FieldPanel, InlinePanel, MultiFieldPanel
 from wagtail.api import APIField
@@ -11,6 +12,8 @@ from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
 from taggit.models import TagBase, TaggedItemBase
 
+from folioblog.core.cache import collect_listing
+from folioblog.core.categories import get_category_stats
 from folioblog.core.managers import I18nMultiSiteManager
 from folioblog.core.models import (
     BaseCategory,
@@ -26,6 +29,9 @@ Image = get_image_model()
 
 class BlogIndexPage(BaseIndexPage):
     ajax_template = "blog/blog_index_item.html"
+    cache_query_params = ["ajax", "category", "page", "after"]
+
+    category_page_model = "blog.BlogPage"
 
     parent_page_types = ["home.HomePage"]
     subpage_types = ["blog.BlogPage"]
@@ -34,13 +40,14 @@ class BlogIndexPage(BaseIndexPage):
         folio_settings = FolioBlogSettings.for_request(request)
         context = super().get_context(request, *args, **kwargs)
 
-        categories = BlogCategory.objects.in_site(folio_settings.site).filter_language().order_by("slug")
+        stats = get_category_stats(self, folio_settings.site_id, get_language())
 
-        context["categories"] = categories
-        context["category_filters"] = [{"name": str(c), "value": c.slug} for c in categories]
+        context["categories"] = stats["categories"]
+        context["category_filters"] = [{"name": c["name"], "value": c["value"]} for c in stats["categories"]]
         context["category_query"] = request.GET.get("category", "")
 
         qs = BlogPage.objects.live().child_of(self).filter_language()
+        collect_listing(BlogPage)
         if request.GET.get("category"):
             qs = qs.filter(category__slug=request.GET["category"])
         qs = qs.select_related("category", "image")
@@ -48,7 +55,10 @@ class BlogIndexPage(BaseIndexPage):
         qs = qs.order_by("-date", "-pk")
 
         paginator = FolioBlogPaginator(qs, folio_settings.blog_pager_limit)
-        context["blogpages"] = paginator.get_page(request.GET.get("page"))
+        context["blogpages"], context["next_after"] = paginator.get_page_after(
+            request.GET.get("page"),
+            request.GET.get("after"),
+        )
 
         return context
 
@@ -149,6 +159,11 @@ class BlogPage(BasePage):
     parent_page_types = ["blog.BlogIndexPage"]
     subpage_types = []
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date", "-page_ptr"], name="blog_blogpage_keyset_idx"),
+        ]
+
 
 class BlogPageRelatedLink(Orderable):
     page = ParentalKey(BlogPage, related_name="related_links")
@@ -1,6 +1,6 @@
 from django.apps import AppConfig
 from django.conf import settings
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.utils.translation import get_language, to_locale
 
 try:
@@ -12,21 +12,47 @@ else:
 
 
 def connect_cache_signal():
+    from folioblog.core.cache import collect_dependency
     from folioblog.core.signals import clear_cache_page
 
+    post_init.connect(collect_dependency, dispatch_uid="folioblog_cache_collect_dependency")
     post_save.connect(clear_cache_page, dispatch_uid="folioblog_cache_clear_save")
     post_delete.connect(clear_cache_page, dispatch_uid="folioblog_cache_clear_delete")
 
 
+def disconnect_cache_signal():
+    post_init.disconnect(dispatch_uid="folioblog_cache_collect_dependency")
+    post_save.disconnect(dispatch_uid="folioblog_cache_clear_save")
+    post_delete.disconnect(dispatch_uid="folioblog_cache_clear_delete")
+
+
+def connect_category_stats_signal():
+    from folioblog.core.categories import get_category_senders
+    from folioblog.core.signals import update_categories
+
+    for sender in get_category_senders():
+        post_save.connect(update_categories, sender=sender, dispatch_uid="folioblog_category_stats_save")
+        post_delete.connect(update_categories, sender=sender, dispatch_uid="folioblog_category_stats_delete")
+
+
+def connect_image_usage_signal():
+    from folioblog.core.signals import update_image_usages
+
+    post_save.connect(update_image_usages, dispatch_uid="folioblog_image_usage_update")
+
+
 class CoreConfig(AppConfig):
     name = "folioblog.core"
     label = "core"
     verbose_name = "Core"
 
     def ready(self):
+        # Before clearing cache pages, for them to be rebuilt with fresh stats.
+        connect_category_stats_signal()
         # Connect signals only if cache page is enabled.
         if "folioblog.core.middleware.AnonymousUpdateCacheMiddleware" in settings.MIDDLEWARE:  # pragma: no cover
             connect_cache_signal()
+        connect_image_usage_signal()
 
         # Add custom faker providers per language
         if not is_prod:  # pragma: no branch
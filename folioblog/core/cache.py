@@ -0,0 +1,567 @@
+import copy
+import gzip
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextvars import ContextVar
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.http.response import ResponseHeaders
+from django.utils.cache import patch_vary_headers
+from django.utils.http import urlencode
+from django.utils.translation import get_language
+
+from wagtail.contrib.settings.models import BaseGenericSetting, BaseSiteSetting
+from wagtail.images.models import AbstractImage
+from wagtail.models import Page, Site
+from wagtail.snippets.models import get_snippet_models
+
+from taggit.models import TagBase
+
+from folioblog.core.utils import get_shuffle_seed
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+_collector = ContextVar("folioblog_cache_collector", default=None)
+
+CODECS = {
+    "gzip": (lambda data: gzip.compress(data, mtime=0), gzip.decompress),
+    "deflate": (zlib.compress, zlib.decompress),
+}
+if zstandard:  # pragma: no cover
+    CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+
+def get_cache():
+    return caches[settings.CACHE_MIDDLEWARE_ALIAS]
+
+
+def get_tracked_models():
+    return tuple([Page, TagBase, AbstractImage, BaseGenericSetting, BaseSiteSetting] + get_snippet_models())
+
+
+def sites_key():
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.sites"
+
+
+def generation_key(site_id, language_code=None):
+    key = f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.generation.{site_id}"
+    return f"{key}.{language_code}" if language_code else key
+
+
+def get_site_id(request):
+    """
+    Resolve the site of the request without any query, thanks to a hostname
+    map shared in cache (i.e: Site.find_for_request() always hit the DB).
+    """
+    cache = get_cache()
+    host = f"{request.get_host()}|{request.get_port()}"
+
+    sites = cache.get(sites_key()) or {}
+    if host not in sites:
+        site = Site.find_for_request(request)
+        sites[host] = site.pk if site else None
+        cache.set(sites_key(), sites, None)
+
+    return sites[host]
+
+
+def query_params_key(site_id, path):
+    path = md5(path.encode(), usedforsecurity=False).hexdigest()
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.query.{site_id}.{path}"
+
+
+def get_generations(site_id, language_code, extra_keys=()):
+    """
+    Return the site generations, with any other keys fetched along the way
+    to save a round trip.
+    """
+    cache = get_cache()
+
+    keys = [generation_key(site_id), generation_key(site_id, language_code)]
+    values = cache.get_many(keys + list(extra_keys))
+
+    for key in keys:
+        if key not in values:
+            # Start from a timestamp instead of zero, just in case the counter
+            # was evicted while some keys with the previous values still exist.
+            cache.add(key, int(time.time() * 1000), None)
+            values[key] = cache.get(key)
+
+    return [values.pop(key) for key in keys], values
+
+
+def get_language_code(request):
+    return getattr(request, "LANGUAGE_CODE", None) or get_language()
+
+
+def normalize_flag(value):
+    return "1" if value else None
+
+
+def normalize_page_number(value):
+    # Same as FolioBlogPaginator: first page if invalid, empty if out of range.
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return str(max(number, 0)) if number != 1 else None
+
+
+def normalize_int(value):
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return value or None
+
+
+def normalize_seed(value):
+    # Same as GalleryPage: current seed if invalid, which is the default one.
+    seed = get_shuffle_seed(value)
+    return str(seed) if seed != get_shuffle_seed() else None
+
+
+def normalize_str(value):
+    return value or None
+
+
+# Normalizers of the query parameters pages could declare, by their names
+# (i.e: only names are shared in cache, not functions).
+QUERY_PARAMS = {
+    "after": normalize_str,
+    "ajax": normalize_flag,
+    "category": normalize_str,
+    "collection": normalize_int,
+    "page": normalize_page_number,
+    "seed": normalize_seed,
+}
+
+
+def get_cache_url(request, query_params=None):
+    """
+    Without any known query parameters for the page, the whole URL is used.
+    Otherwise, only its query parameters are kept, normalized and sorted.
+    """
+    if query_params is None:
+        return request.build_absolute_uri()
+
+    query = []
+    for name in sorted(query_params):
+        normalize = QUERY_PARAMS.get(name, normalize_str)
+        # Like request.GET.get(), the last value wins.
+        value = normalize(request.GET[name]) if name in request.GET else None
+        if value is not None:
+            query.append((name, value))
+
+    url = request.build_absolute_uri(request.path)
+    return f"{url}?{urlencode(query)}" if query else url
+
+
+def get_page_keys(request, site_id):
+    """
+    Return the keys of a page: a tiny marker which is fresh as long as the
+    page is (i.e: bound to the site generations and evicted by dependencies)
+    and the entry holding the response itself. The entry don't depends on the
+    generations, so that it could still be served while stale.
+    """
+    language_code = get_language_code(request)
+    params_key = query_params_key(site_id, request.path)
+    generations, values = get_generations(site_id, language_code, [params_key])
+    generations = ".".join(str(g) for g in generations)
+
+    # HEAD and GET share the same entry, views don't make any difference.
+    url = md5(get_cache_url(request, values.get(params_key)).encode(), usedforsecurity=False).hexdigest()
+    suffix = f"{url}.{language_code}"
+    return (
+        f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.{site_id}.{generations}.{suffix}",
+        f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.{site_id}.page.{suffix}",
+    )
+
+
+def record_query_params(site_id, path, query_params, timeout):
+    # Expire with the cache pages, and forget them as soon as the page at this
+    # path doesn't declare any.
+    key = query_params_key(site_id, path)
+    if query_params is None:
+        get_cache().delete(key)
+    else:
+        get_cache().set(key, sorted(query_params), timeout)
+
+
+def lock_key(key):
+    return f"{key}.lock"
+
+
+def acquire_lock(key, timeout):
+    return get_cache().add(lock_key(key), True, timeout)
+
+
+def release_lock(key):
+    get_cache().delete(lock_key(key))
+
+
+def invalidate_site(site_id, language_code=None):
+    """
+    Invalidate all cache pages of a site (or just one of its language) at once,
+    by bumping its generation which is part of any of its cache keys. Stale
+    entries are then just left for expiration.
+    """
+    cache = get_cache()
+    key = generation_key(site_id, language_code)
+    local_cache.clear()
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Not initialized yet, so nothing could be cached with it anyway.
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def clear_sites():
+    get_cache().delete(sites_key())
+
+
+class DependencyCollector:
+    """
+    Collect model instances loaded while a response is built, in order to
+    know later which cache keys must be evicted when one of them change.
+    """
+
+    def __init__(self):
+        self.models = get_tracked_models()
+        self.dependencies = set()
+        self.last_modified = None
+
+    def add(self, instance):
+        if instance.pk is not None and isinstance(instance, self.models):
+            self.dependencies.add(get_instance_dependency(instance))
+
+            # Don't trigger any query for deferred fields.
+            last_published_at = instance.__dict__.get("last_published_at")
+            if last_published_at and (not self.last_modified or last_published_at > self.last_modified):
+                self.last_modified = last_published_at
+
+
+def get_instance_dependency(instance):
+    # Page instances could be loaded either as generic or specific pages, so
+    # rely on the shared primary key of the base Page model instead.
+    label = Page._meta.label_lower if isinstance(instance, Page) else instance._meta.label_lower
+    return label, instance.pk
+
+
+def get_instance_site_ids(instance):
+    site_id = getattr(instance, "site_id", None)
+    if site_id:
+        return [site_id]
+
+    if isinstance(instance, Page):
+        site = instance.get_site()
+        if site:
+            return [site.pk]
+
+    # No way to know it (i.e: images or translated pages), so check them all.
+    return list(Site.objects.values_list("pk", flat=True))
+
+
+def dependency_key(site_id, label, pk=None):
+    key = f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.deps.{site_id}.{label}"
+    return f"{key}.{pk}" if pk is not None else key
+
+
+def slot_counter_key(site_id, period):
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.slots.{site_id}.{period}"
+
+
+def start_tracking():
+    collector = DependencyCollector()
+    _collector.set(collector)
+    return collector
+
+
+def stop_tracking():
+    collector = _collector.get()
+    _collector.set(None)
+    return collector
+
+
+def collect_dependency(sender, instance, **kwargs):
+    collector = _collector.get()
+    if collector is not None:
+        collector.add(instance)
+
+
+def collect_dependencies(dependencies):
+    # For data read without loading any instance, i.e: from the cache.
+    collector = _collector.get()
+    if collector is not None:
+        collector.dependencies.update(dependencies)
+
+
+def collect_listing(*models):
+    # Listings must be refreshed on new instances of their models too.
+    collect_dependencies([(model._meta.label_lower, None) for model in models])
+
+
+def dependency_periods():
+    # Counters are bound to a period, so that they expire with their slots.
+    # Pages are assumed to be cached no longer than CACHE_MIDDLEWARE_SECONDS.
+    current = int(time.time() // settings.CACHE_MIDDLEWARE_SECONDS)
+    return [current - 1, current]
+
+
+def record_dependencies(site_id, pages, dependencies, timeout):
+    """
+    Index cache pages by their dependencies. Pages are a mapping of their
+    cache key to their URL and whether it was requested with AJAX, in order
+    to warm them up later once evicted.
+
+    Pages get one slot of their site, allocated by an atomic counter and
+    shared by all their dependencies, so that concurrent misses never lose
+    each other's pages and nothing is rewritten as the index grows.
+    """
+    cache = get_cache()
+    period = dependency_periods()[-1]
+    counter_key = slot_counter_key(site_id, period)
+
+    try:
+        slot = cache.incr(counter_key)
+    except ValueError:
+        # Must outlive any slot of its period.
+        cache.add(counter_key, 0, settings.CACHE_MIDDLEWARE_SECONDS + timeout)
+        slot = cache.incr(counter_key)
+
+    cache.set_many(
+        {f"{dependency_key(site_id, label, pk)}.{period}.{slot}": pages for label, pk in dependencies}, timeout
+    )
+
+
+def get_dependency_slots(site_ids, dependencies):
+    """
+    Return slots of cache pages which depend on any of the dependencies, with
+    their site and pages, along with the floors to skip them next time.
+    """
+    cache = get_cache()
+
+    prefixes = {
+        f"{dependency_key(site_id, label, pk)}.{period}": (site_id, slot_counter_key(site_id, period))
+        for site_id in site_ids
+        for label, pk in dependencies
+        for period in dependency_periods()
+    }
+    values = cache.get_many({key for _, key in prefixes.values()} | {f"{prefix}.floor" for prefix in prefixes})
+
+    slot_keys = {}
+    floors = {}
+    for prefix, (site_id, counter_key) in prefixes.items():
+        count = values.get(counter_key, 0)
+        # Slots below the floor were already evicted.
+        floor = values.get(f"{prefix}.floor", 0)
+        for slot in range(floor + 1, count + 1):
+            slot_keys[f"{prefix}.{slot}"] = site_id
+        if count > floor:
+            floors[f"{prefix}.floor"] = count
+
+    slots = {slot_key: (slot_keys[slot_key], pages) for slot_key, pages in cache.get_many(list(slot_keys)).items()}
+    return slots, floors
+
+
+def get_dependent_pages(site_ids, dependencies):
+    """
+    Return cache pages which depend on any of the dependencies, keyed by
+    their cache key, with their site, URL and whether it was requested with
+    AJAX.
+    """
+    slots, _ = get_dependency_slots(site_ids, dependencies)
+    return {key: (site_id, url, ajax) for site_id, pages in slots.values() for key, (url, ajax) in pages.items()}
+
+
+def invalidate_instance(instance, created=False):
+    """
+    Evict cache pages which depend on the instance and return them, with
+    their site, URL and whether it was requested with AJAX.
+    """
+    cache = get_cache()
+
+    # Listings must be refreshed on new instances. Pages are special because
+    # they could also appear in listings once published, which is a save.
+    dependencies = [get_instance_dependency(instance)]
+    if created or isinstance(instance, Page):
+        dependencies.append((instance._meta.label_lower, None))
+
+    slots, floors = get_dependency_slots(get_instance_site_ids(instance), dependencies)
+    pages = {
+        key: (site_id, url, ajax) for site_id, slot_pages in slots.values() for key, (url, ajax) in slot_pages.items()
+    }
+
+    cache.delete_many(list(pages) + list(slots))
+    # Pages recorded concurrently are left as is, like any page built with
+    # the data before this change.
+    cache.set_many(floors, settings.CACHE_MIDDLEWARE_SECONDS * 2)
+    if pages:
+        # Local copies are not indexed, so drop them all (current process only).
+        local_cache.clear()
+    return pages
+
+
+def get_encoding():
+    encoding = settings.FOLIOBLOG_CACHE_COMPRESS_ENCODING
+    # i.e: zstd without its optional package.
+    return encoding if encoding in CODECS else "gzip"
+
+
+def compress_response(response):
+    """
+    Return a copy of the response to store, with its body compressed if it is
+    big enough. The original response is left as is for the current request.
+    """
+    min_length = settings.FOLIOBLOG_CACHE_COMPRESS_MIN_LENGTH
+    if min_length is None or response.has_header("Content-Encoding") or len(response.content) < min_length:
+        return response
+
+    patch_vary_headers(response, ["Accept-Encoding"])
+
+    encoding = get_encoding()
+    compress, _ = CODECS[encoding]
+    content = compress(response.content)
+
+    stored = HttpResponse(content, status=response.status_code, reason=response.reason_phrase)
+    for header, value in response.items():
+        stored[header] = value
+    stored.cookies = response.cookies
+    stored["Content-Encoding"] = encoding
+    stored["Content-Length"] = len(content)
+    # Strong validators must differ between representations.
+    if response.has_header("ETag"):
+        stored["ETag"] = f'{response["ETag"][:-1]}-{encoding}"'
+    return stored
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """
+    Whether the Accept-Encoding header allows the encoding, according to its
+    q-values (i.e: "gzip;q=0" refuses it). An explicit coding wins over "*".
+    """
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        qvalue = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        if coding:
+            qvalues[coding.lower()] = qvalue
+
+    qvalue = qvalues.get(encoding, qvalues.get("*", 0.0))
+    return qvalue > 0
+
+
+def decompress_response(response, accept_encoding):
+    """
+    Serve the compressed body as is if the client accepts it, otherwise
+    decompress it.
+    """
+    encoding = response.get("Content-Encoding")
+    if encoding not in CODECS or accepts_encoding(accept_encoding, encoding):
+        return response
+
+    _, decompress = CODECS[encoding]
+    response.content = decompress(response.content)
+    del response["Content-Encoding"]
+    response["Content-Length"] = len(response.content)
+    if response.has_header("ETag"):
+        response["ETag"] = response["ETag"].replace(f'-{encoding}"', '"')
+    return response
+
+
+def copy_response(response):
+    # Shallow copy is enough, content is replaced but never mutated in place.
+    response = copy.copy(response)
+    response.headers = ResponseHeaders(response.headers)
+    response.cookies = copy.deepcopy(response.cookies)
+    response._resource_closers = []
+    return response
+
+
+def local_cache_key(request):
+    # Built from the request only, so that local hits don't need any round
+    # trip to the shared cache (i.e: for the site or its generations).
+    host = f"{request.get_host()}|{request.get_port()}"
+    return f"{host}|{get_language_code(request)}|{request.get_full_path()}"
+
+
+class LocalPageCache:
+    """
+    Per-process LRU in front of the shared cache for the hottest pages.
+    Entries are served without checking the shared cache at all, but only
+    for FOLIOBLOG_CACHE_LOCAL_SECONDS: invalidations are applied at once in
+    the current process, other processes may serve them until they expire.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return settings.FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return copy_response(entry[1])
+
+    def set(self, key, response):
+        size = len(response.content)
+        if size > settings.FOLIOBLOG_CACHE_LOCAL_MAX_BYTES:
+            return
+
+        with self._lock:
+            self._pop(key)
+            expires_at = time.monotonic() + settings.FOLIOBLOG_CACHE_LOCAL_SECONDS
+            self._entries[key] = (expires_at, copy_response(response), size)
+            self._size += size
+
+            while (
+                len(self._entries) > settings.FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES
+                or self._size > settings.FOLIOBLOG_CACHE_LOCAL_MAX_BYTES
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[2]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalPageCache()
@@ -0,0 +1,122 @@
+from functools import cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count
+
+from wagtail.models import Page
+
+from folioblog.core.cache import collect_dependencies, get_cache
+
+
+def category_stats_key(site_id, language_code, page_id):
+    return f"{settings.CACHE_MIDDLEWARE_KEY_PREFIX}.categories.{site_id}.{language_code}.{page_id}"
+
+
+def get_category_index_models():
+    """
+    Index pages filtered by categories, i.e: with a category_page_model.
+    """
+    return [model for model in apps.get_models() if getattr(model, "category_page_model", None)]
+
+
+def get_category_models(index_model):
+    page_model = apps.get_model(index_model.category_page_model)
+    return page_model, page_model._meta.get_field("category").related_model
+
+
+@cache
+def get_category_senders():
+    """
+    Page and category models changing the stats, with their index model.
+    Built once, models being all registered by then.
+    """
+    senders = {}
+    for index_model in get_category_index_models():
+        for model in get_category_models(index_model):
+            senders[model] = index_model
+    return senders
+
+
+def build_category_stats(index_page, site_id, language_code):
+    """
+    Count live children of an index page per category, along with the
+    ordered categories to filter them.
+    """
+    index_model = index_page.specific_class
+    page_model, category_model = get_category_models(index_model)
+
+    counts = dict(
+        page_model.objects.child_of(index_page)
+        .live()
+        .filter_language(language_code)
+        .values_list("category")
+        .annotate(total=Count("pk"))
+        .order_by()
+    )
+    categories = [
+        {"pk": pk, "name": name, "value": slug, "total": counts.get(pk, 0)}
+        for pk, name, slug in (
+            category_model.objects.filter(site_id=site_id)
+            .filter_language(language_code)
+            .order_by("slug")
+            .values_list("pk", "name", "slug")
+        )
+    ]
+    if getattr(index_model, "category_hide_empty", False):
+        categories = [category for category in categories if category["total"]]
+
+    return {"total": sum(counts.values()), "categories": categories}
+
+
+def get_category_stats(index_page, site_id, language_code):
+    """
+    Return the category stats of an index page from the cache, built on
+    misses. Cache pages using them still depend on their categories.
+    """
+    cache = get_cache()
+    key = category_stats_key(site_id, language_code, index_page.pk)
+
+    stats = cache.get(key)
+    if stats is None:
+        stats = build_category_stats(index_page, site_id, language_code)
+        cache.set(key, stats, settings.FOLIOBLOG_CATEGORY_STATS_SECONDS)
+
+    label = get_category_models(index_page.specific_class)[1]._meta.label_lower
+    collect_dependencies([(label, None)] + [(label, category["pk"]) for category in stats["categories"]])
+    return stats
+
+
+def refresh_category_stats(index_page):
+    site = index_page.get_site()
+    if site is None:
+        return
+
+    language_code = index_page.locale.language_code
+    stats = build_category_stats(index_page, site.pk, language_code)
+    get_cache().set(
+        category_stats_key(site.pk, language_code, index_page.pk),
+        stats,
+        settings.FOLIOBLOG_CATEGORY_STATS_SECONDS,
+    )
+
+
+def update_category_stats(sender, instance):
+    """
+    Refresh stats of the index page of a page, or drop those listing a
+    category (rebuilt on the next read).
+    """
+    index_model = get_category_senders()[sender]
+
+    if sender is get_category_models(index_model)[0]:
+        parent_path = instance.path[: -Page.steplen]
+        index_page = index_model.objects.filter(path=parent_path).first()
+        if index_page:
+            refresh_category_stats(index_page)
+    else:
+        get_cache().delete_many(
+            [
+                category_stats_key(instance.site_id, language_code, pk)
+                for pk, language_code in index_model.objects.values_list("pk", "locale__language_code")
+            ]
+        )
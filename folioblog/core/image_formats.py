@@ -3,6 +3,8 @@ from django.utils.html import format_html
 from wagtail.images.formats import Format, register_image_format
 from wagtail.images.shortcuts import get_rendition_or_not_found
 
+from folioblog.core.renditions import SPECS
+
 
 class BodyFullImageFormat(Format):
     def image_to_html(self, image, alt_text, extra_attributes=None):
@@ -14,7 +16,7 @@ class BodyFullImageFormat(Format):
 class CreditLightboxImageFormat(Format):
     def image_to_html(self, image, alt_text, extra_attributes=None):
         img_html = super().image_to_html(image, alt_text, extra_attributes)
-        rendition_full = get_rendition_or_not_found(image, "width-1920|format-jpeg")
+        rendition_full = get_rendition_or_not_found(image, SPECS["richtext"]["image_full"])
         alt_text_html = image.figcaption(alt_text)
 
         html = f"""
@@ -38,7 +40,7 @@ register_image_format(
         name="bodyfullfuild",
         label="Body Full (w940)",
         classname="img-fluid mx-auto d-block rounded",
-        filter_spec="width-940",
+        filter_spec=SPECS["richtext"]["image"],
     )
 )
 
@@ -47,6 +49,6 @@ register_image_format(
         name="creditlightbox",
         label="Credit Lightbox (w940)",
         classname="img-fluid mx-auto d-block rounded",
-        filter_spec="width-940",
+        filter_spec=SPECS["richtext"]["image"],
     )
 )
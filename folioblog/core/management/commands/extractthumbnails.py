@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from wagtail.models import Collection
+
+from folioblog.core.utils import socket_timeout
+from folioblog.video.models import ThumbnailJob, VideoPage
+
+
+class Command(BaseCommand):
+    help = "Extract thumbnails of video pages queued on save, out of the editor requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Queue first all video pages without thumbnail",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Maximum number of jobs to process",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=settings.FOLIOBLOG_VIDEO_THUMBNAIL_TIMEOUT,
+            help="Timeout of each network call, in seconds",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=settings.FOLIOBLOG_VIDEO_THUMBNAIL_MAX_ATTEMPTS,
+            help="Give up jobs after this number of failed attempts",
+        )
+
+    def handle(self, *args, **options):
+        self.timeout = options["timeout"]
+
+        if options["backfill"]:
+            pages = VideoPage.objects.filter(thumbnail__isnull=True, thumbnail_job__isnull=True)
+            page_ids = pages.values_list("pk", flat=True)
+            jobs = ThumbnailJob.objects.bulk_create(
+                [ThumbnailJob(page_id=pk) for pk in page_ids],
+                ignore_conflicts=True,
+            )
+            # Jobs given up are requeued too.
+            requeued = ThumbnailJob.objects.filter(
+                page__thumbnail__isnull=True,
+                attempts__gte=options["max_attempts"],
+            ).update(attempts=0, scheduled_at=timezone.now())
+            self.stdout.write(f"{len(jobs) + requeued} video pages queued")
+
+        jobs = (
+            ThumbnailJob.objects.filter(attempts__lt=options["max_attempts"], scheduled_at__lte=timezone.now())
+            .select_related("page")
+            .order_by("scheduled_at", "pk")
+        )
+        jobs = list(jobs[: options["limit"]])
+
+        done = failed = 0
+        if jobs:
+            self.collection = Collection.objects.get(name="Video thumbnail")
+
+            with socket_timeout(self.timeout):
+                for job in jobs:
+                    if self.process_job(job):
+                        done += 1
+                    else:
+                        failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{done} thumbnails extracted, {failed} failed."))
+
+    def process_job(self, job):
+        page = job.page
+
+        if page.thumbnail_id is None:
+            try:
+                thumbnail = page.extract_thumbnail(self.collection, self.timeout)
+            except Exception as exc:
+                self.stdout.write(self.style.ERROR(f"Error on thumbnail of page {page.pk} with exc {exc}"))
+                thumbnail = None
+
+            if thumbnail is None:
+                job.attempts += 1
+                delay = settings.FOLIOBLOG_VIDEO_THUMBNAIL_RETRY_SECONDS * 2 ** (job.attempts - 1)
+                job.scheduled_at = timezone.now() + timedelta(seconds=delay)
+                job.save(update_fields=["attempts", "scheduled_at"])
+                self.stdout.write(self.style.WARNING(f"No thumbnail for page {page.pk}, attempt {job.attempts}."))
+                return False
+
+            page.attach_thumbnail(thumbnail)
+
+        job.delete()
+        return True
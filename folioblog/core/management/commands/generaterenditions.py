@@ -1,18 +1,70 @@
+from concurrent.futures import ProcessPoolExecutor
+
 from django.core.management.base import BaseCommand
+from django.db import connections
 
 from wagtail.images import get_image_model
+from wagtail.images.models import Filter
 from wagtail.models import Collection, Site
 
 from folioblog.core.models import FolioBlogSettings
-from folioblog.gallery.templatetags.gallery import SPECS_LANDSCAPE, SPECS_PORTRAIT
+from folioblog.core.renditions import get_image_roles, get_specs
 
 Image = get_image_model()
+Rendition = Image.get_rendition_model()
+
+# Enough to know specs and focal point keys of images.
+IMAGE_FIELDS = ["id", "width", "height", "focal_point_x", "focal_point_y", "focal_point_width", "focal_point_height"]
+
+
+def generate_renditions(jobs):
+    """
+    Generate renditions of some images, one image at a time. Each original
+    is read once for all its specs.
+    """
+    images = Image.objects.in_bulk([pk for pk, specs in jobs])
+
+    count = 0
+    for pk, specs in jobs:
+        images[pk].get_renditions(*specs)
+        count += len(specs)
+    return count
 
 
 class Command(BaseCommand):
-    help = "Generate renditions for gallery page"
+    help = "Generate renditions for gallery page, and optionally for all pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            action="store_true",
+            default=False,
+            help="Generate renditions of page images too (@see folioblog.core.renditions)",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Only generate missing renditions, an interrupted run would resume where it stopped",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes generating renditions",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=20,
+            help="Number of images per job, to report progress and bound the memory used",
+        )
 
     def handle(self, *args, **options):
+        self.incremental = options["incremental"]
+        workers = max(options["workers"], 1)
+        batch_size = max(options["batch_size"], 1)
+
         sites = Site.objects.all()
         for site in sites:
             site_settings = FolioBlogSettings.for_site(site)
@@ -22,19 +74,75 @@ class Command(BaseCommand):
 
             self.stdout.write(f"About generating renditions for site {site}")
 
-            count = self.generate_site_renditions(site_settings.gallery_collection)
+            count = self.generate_site_renditions(site_settings.gallery_collection, workers, batch_size)
 
             self.stdout.write(self.style.SUCCESS(f"{count} renditions generated for site {site}"))
 
-    def generate_site_renditions(self, root_collection):
+        if options["pages"]:
+            self.stdout.write("About generating renditions for pages")
+
+            roles = get_image_roles()
+            jobs = self.get_jobs(Image.objects.filter(pk__in=list(roles)), lambda image: roles[image.pk])
+            count = self.generate(jobs, workers, batch_size)
+
+            self.stdout.write(self.style.SUCCESS(f"{count} renditions generated for pages"))
+
+    def generate_site_renditions(self, root_collection, workers=1, batch_size=20):
         collection_qs = Collection.objects.descendant_of(root_collection)
         qs = Image.objects.filter(collection__in=collection_qs)
 
-        count = 0
-        for image in qs:
-            specs = SPECS_PORTRAIT if image.is_portrait() else SPECS_LANDSCAPE
-            for spec in specs.values():
-                image.get_rendition(spec)
-                count += 1
+        jobs = self.get_jobs(qs, lambda image: ["gallery"])
+        return self.generate(jobs, workers, batch_size)
+
+    def get_jobs(self, qs, get_roles):
+        """
+        Return specs to generate per image id. In incremental mode, existing
+        renditions are fetched at once to only keep missing ones.
+        """
+        existing = set()
+        if self.incremental:
+            existing = set(
+                Rendition.objects.filter(image__in=qs).values_list("image_id", "filter_spec", "focal_point_key")
+            )
+
+        jobs = []
+        filters = {}
+        for image in qs.select_related(None).only(*IMAGE_FIELDS).order_by("pk"):
+            specs = dict.fromkeys(
+                spec for role in sorted(get_roles(image)) for spec in get_specs(image, role).values()
+            )
+            if existing:
+                specs = [
+                    spec
+                    for spec in specs
+                    if (image.pk, spec, filters.setdefault(spec, Filter(spec)).get_cache_key(image)) not in existing
+                ]
+            if specs:
+                jobs.append((image.pk, tuple(specs)))
+
+        if self.incremental:
+            self.stdout.write(f"{len(jobs)} images with missing renditions")
+        return jobs
+
+    def generate(self, jobs, workers=1, batch_size=20):
+        # Only ids and specs are sent to workers, which load images by batch.
+        batches = []
+        for start in range(0, len(jobs), batch_size):
+            end = start + batch_size
+            batches.append(jobs[start:end])
+
+        if workers == 1:
+            return self.collect(batches, map(generate_renditions, batches), len(jobs))
+
+        # Forked processes must not share the connections of their parent.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return self.collect(batches, executor.map(generate_renditions, batches), len(jobs))
 
+    def collect(self, batches, results, total):
+        count = done = 0
+        for batch, batch_count in zip(batches, results):
+            count += batch_count
+            done += len(batch)
+            self.stdout.write(f"Progress: {done}/{total} images")
         return count
@@ -1,76 +1,337 @@
+import json
 import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlparse
 
 from django.conf import settings
-from django.core.cache import cache
 from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
 from django.urls import reverse
-from django.utils import translation
+from django.utils import timezone, translation
 
+from wagtail.images import get_image_model
 from wagtail.models import Collection, Page, Site
 
 import requests
 from requests import RequestException
 
-from folioblog.blog.models import BlogCategory, BlogIndexPage, BlogPage
+from folioblog.blog.models import BlogIndexPage
+from folioblog.core.cache import invalidate_site
+from folioblog.core.categories import get_category_models
 from folioblog.core.managers import qs_in_site_alt
-from folioblog.core.models import FolioBlogSettings
+from folioblog.core.models import FolioBlogSettings, WarmupURL
+from folioblog.core.pagination import keyset_token
 from folioblog.gallery.models import GalleryPage
-from folioblog.video.models import VideoCategory, VideoIndexPage, VideoPage
+from folioblog.video.models import VideoIndexPage
+
+AJAX_HEADERS = {
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+# Request line of common/combined log formats, i.e: "GET /blog/?page=2 HTTP/1.1"
+LOG_REQUEST_RE = re.compile(r'"(?:GET|HEAD) (\S+) HTTP/[\d.]+"')
+
+
+def url_key(url):
+    """
+    Path with sorted query parameters, to match URLs whatever their host.
+    """
+    parsed = urlparse(url)
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return f"{parsed.path}?{query}" if query else parsed.path
+
+
+def read_access_log(path):
+    hits = Counter()
+    with open(path, errors="replace") as f:
+        for line in f:
+            match = LOG_REQUEST_RE.search(line)
+            if match:
+                hits[url_key(match.group(1))] += 1
+    return hits
+
+
+def render_page(url, headers=None):
+    """
+    Render a page through the whole middleware stack, like a real anonymous
+    request would do, but without any network.
+    """
+    parsed = urlparse(url)
+    client = Client(raise_request_exception=False, HTTP_HOST=parsed.netloc)
+
+    start = time.monotonic()
+    response = client.get(url, follow=True, secure=parsed.scheme == "https", headers=headers)
+    return response.status_code, time.monotonic() - start
+
+
+class RateLimiter:
+    """
+    Space out requests of a site, whatever the number of threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
 
 
 class Command(BaseCommand):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.session = requests.session()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of concurrent requests (threads) or renderings (processes)",
+        )
+        parser.add_argument(
+            "--in-process",
+            action="store_true",
+            default=False,
+            help="Render pages in-process instead of requesting them over HTTP",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            default=False,
+            help="Only warm up pages evicted by content changes (@see FOLIOBLOG_CACHE_WARMUP_QUEUE)",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Maximum number of requests per second and per site (default: no limit)",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=0,
+            help="Number of retries on network errors or server errors",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=0.5,
+            help="Delay in seconds before the first retry, doubled on each retry",
+        )
+        parser.add_argument(
+            "--log",
+            help="Access log file (common or combined format) to warm up the most requested pages first",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Output the planned requests as JSON, without requesting nor invalidating anything",
+        )
+
+    @property
+    def session(self):
+        # Sessions are not thread safe, so one per thread.
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.session()
+        return self.local.session
 
     def handle(self, *args, **options):
-        # First clear the cache before rebuilding it!
-        self.stdout.write(self.style.WARNING("WARNING: clearing cache...\n"))
-        cache.clear()
+        self.retries = options["retries"]
+        self.backoff = options["backoff"]
+        self.timings = defaultdict(list)
+        self.dry_run = options["dry_run"]
+
+        sites = Site.objects.all()
+        self.requests = []
+
+        if options["incremental"]:
+            queue = self.process_queue()
+        else:
+            self.process_sites(sites)
+
+        # Most valuable pages first.
+        hits = read_access_log(options["log"]) if options["log"] else {}
+        self.rank(hits)
+
+        if self.dry_run:
+            self.write_plan(hits)
+            return
+
+        # Then request them all at once, up to the concurrency limit.
+        concurrency = max(options["concurrency"], 1)
+        if options["in_process"]:
+            self.render_all(concurrency)
+        else:
+            self.request_all(concurrency, options["rate"], sites)
+
+        if options["incremental"]:
+            # Pages evicted again meanwhile are kept for the next run.
+            WarmupURL.objects.filter(pk__in=[item.pk for item in queue], created_at__lte=self.started).delete()
+            self.stdout.write(self.style.SUCCESS(f"{len(queue)} evicted pages loaded."))
+        else:
+            for site in sites:
+                self.stdout.write(self.style.SUCCESS(f"All page cache loaded for site {site}."))
+        self.write_summary()
+
+    def process_queue(self):
+        self.started = timezone.now()
+        queue = list(WarmupURL.objects.filter(created_at__lte=self.started).select_related("site").order_by("pk"))
+        for item in queue:
+            self.add_request(item.site, "queue", item.url, headers=AJAX_HEADERS if item.ajax else None)
+        return queue
+
+    def process_sites(self, sites):
+        # First invalidate the page cache of each site before rebuilding it!
+        # Other cache entries (i.e: sessions, embeds, etc) are kept.
+        if not self.dry_run:
+            self.stdout.write(self.style.WARNING("WARNING: clearing cache...\n"))
+            for site in sites:
+                invalidate_site(site.pk)
 
-        # Then iterate over each sites to fetch their pages.
-        for site in Site.objects.all():
+        # Then iterate over each sites to collect their URLs.
+        for site in sites:
             self.process_site(site, FolioBlogSettings.for_site(site))
 
-    def process_site(self, site, folio_settings):
-        self.stdout.write(self.style.WARNING(f"About requesting pages of site {site}:"))
+    def rank(self, hits):
+        # Sort is stable, so the planning order is kept for ties.
+        priorities = settings.FOLIOBLOG_CACHE_WARMUP_PRIORITIES
+        self.requests.sort(key=lambda r: (-hits.get(url_key(r[2]["url"]), 0), -priorities.get(r[1], 0)))
 
-        # Fetch pages with translations to build renditions and page cache.
-        qs = Page.objects.live().public().order_by("pk")
-        qs = qs_in_site_alt(qs, site)
-        for page in qs:
-            self.process_page(page, folio_settings)
+    def write_plan(self, hits):
+        priorities = settings.FOLIOBLOG_CACHE_WARMUP_PRIORITIES
+        plan = [
+            {
+                "site": site.hostname,
+                "kind": kind,
+                "url": kwargs["url"],
+                "ajax": bool(kwargs.get("headers")),
+                "status": kwargs.get("status"),
+                "priority": priorities.get(kind, 0),
+                "hits": hits.get(url_key(kwargs["url"]), 0),
+            }
+            for site, kind, kwargs in self.requests
+        ]
+        self.stdout.write(json.dumps(plan, indent=2))
 
-        # Fetch views
-        self.stdout.write(self.style.WARNING("About requesting views:"))
-        self.process_view(site)
+    def request_all(self, concurrency, rate, sites):
+        limiters = {site.pk: RateLimiter(rate) for site in sites}
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.request_job, limiters[site.pk], kind, **kwargs)
+                for site, kind, kwargs in self.requests
+            ]
+            for future in futures:
+                future.result()
 
-        # Finally don't forgot 404 page for renditions ONLY (ie: not the url)
-        self.request_page(f"{site.root_url}/givemea404please", status=404)
+    def render_all(self, concurrency):
+        if "folioblog.core.middleware.AnonymousFetchCacheMiddleware" not in settings.MIDDLEWARE:
+            self.stdout.write(self.style.WARNING("Page cache is disabled, only renditions would be generated."))
+
+        if concurrency == 1:
+            for site, kind, kwargs in self.requests:
+                self.render_job(kind, render_page(kwargs["url"], kwargs.get("headers")), **kwargs)
+            return
+
+        # Forked processes must not share the connections of their parent.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                (kind, kwargs, executor.submit(render_page, kwargs["url"], kwargs.get("headers")))
+                for site, kind, kwargs in self.requests
+            ]
+            for kind, kwargs, future in futures:
+                self.render_job(kind, future.result(), **kwargs)
+
+    def render_job(self, kind, result, url, status=None, **kwargs):
+        status_code, duration = result
+        ok = status_code == status if status else status_code < 400
 
-        self.stdout.write(self.style.SUCCESS(f"All page cache loaded for site {site}.\n"))
+        self.stdout.write(f'Rendering: GET "{url}"')
+        if not ok:
+            self.stdout.write(self.style.WARNING(f"Error for page {url} with status {status_code}.\n"))
+        self.timings[kind].append((duration, ok))
 
-    def process_page(self, page, folio_settings):
-        # First request page without parameters.
-        self.request_page(page.full_url)
+    def request_job(self, limiter, kind, **kwargs):
+        limiter.wait()
 
-        # Then request pages with pagination.
-        limit = None
-        if page.specific_class in [BlogIndexPage, VideoIndexPage]:
-            limit = (
-                folio_settings.video_pager_limit
-                if page.specific_class is VideoIndexPage
-                else folio_settings.blog_pager_limit
+        start = time.monotonic()
+        response = self.request_page(**kwargs)
+        duration = time.monotonic() - start
+
+        status = kwargs.get("status")
+        ok = response is not None and (response.status_code == status if status else response.ok)
+        with self.lock:
+            self.timings[kind].append((duration, ok))
+
+    def write_summary(self):
+        self.stdout.write("\nTimings:")
+        for kind, timings in sorted(self.timings.items()):
+            durations = [d for d, ok in timings]
+            errors = len([ok for d, ok in timings if not ok])
+            self.stdout.write(
+                f"{kind}: {len(timings)} requests, {errors} errors, total {sum(durations):.2f}s, "
+                f"avg {sum(durations) / len(durations):.3f}s, max {max(durations):.3f}s"
             )
-            self.request_pagination(page, limit)
 
-        # Then request pages with pagination AND filtering.
-        if page.specific_class is BlogIndexPage:
-            self.request_filtering_blog_category(folio_settings.site, page, limit)
-        elif page.specific_class is VideoIndexPage:
-            self.request_filtering_video_category(folio_settings.site, page, limit)
-        elif page.specific_class is GalleryPage:
-            self.request_filtering_collection(page, folio_settings.gallery_collection)
+    def add_request(self, site, kind, url, **kwargs):
+        self.requests.append((site, kind, {"url": url, **kwargs}))
+
+    def process_site(self, site, folio_settings):
+        if not self.dry_run:
+            self.stdout.write(self.style.WARNING(f"About requesting pages of site {site}:"))
+
+        # Fetch pages with translations to build renditions and page cache,
+        # shallow ones first.
+        qs = Page.objects.live().public().select_related("locale").order_by("depth", "path")
+        pages = list(qs_in_site_alt(qs, site))
+
+        collections = None
+        for page in pages:
+            self.add_request(site, "page", page.full_url)
+
+            if page.specific_class in [BlogIndexPage, VideoIndexPage]:
+                limit = (
+                    folio_settings.video_pager_limit
+                    if page.specific_class is VideoIndexPage
+                    else folio_settings.blog_pager_limit
+                )
+                # Then request pages with pagination, with AND without filtering.
+                self.request_keyset_pagination(site, page, limit)
+            elif page.specific_class is GalleryPage:
+                if collections is None:
+                    collections = self.get_collections(folio_settings.gallery_collection)
+                limit = folio_settings.gallery_pager_limit
+                # Same seed as the one rendered by the page requested above.
+                query = f"&seed={page.specific_class.get_current_seed()}"
+                self.request_pagination(site, page, sum(total for pk, total in collections), limit, query)
+                self.request_filtering_collection(site, page, collections, limit, query)
+
+        # Fetch views
+        if not self.dry_run:
+            self.stdout.write(self.style.WARNING("About requesting views:"))
+        self.process_view(site)
+
+        # Finally don't forgot 404 page for renditions ONLY (ie: not the url)
+        self.add_request(site, "404", f"{site.root_url}/givemea404please", status=404)
 
     def process_view(self, site):
         views = ["javascript-catalog", "rss"]
@@ -78,70 +339,94 @@ class Command(BaseCommand):
             for view_name in views:
                 with translation.override(lang):
                     url = reverse(view_name)
-                self.request_page(f"{site.root_url}{url}")
+                self.add_request(site, "view", f"{site.root_url}{url}")
 
     def request_page(self, url, method="get", status=None, **kwargs):
-        self.stdout.write(f'Requesting: {method.upper()} "{url}"')
+        with self.lock:
+            self.stdout.write(f'Requesting: {method.upper()} "{url}"')
 
-        try:
-            response = getattr(self.session, method)(url, **kwargs)
-        except RequestException as e:
-            self.stdout.write(self.style.ERROR(f"Error on page {url} with exc {e}\n"))
-        else:
-            if (not status and not response.ok) or (status and status != response.status_code):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                response = getattr(self.session, method)(url, **kwargs)
+            except RequestException as e:
+                exc, response = e, None
+            else:
+                # Only server errors are worth a retry.
+                if response.status_code < 500 or status == response.status_code:
+                    break
+
+        with self.lock:
+            if response is None:
+                self.stdout.write(self.style.ERROR(f"Error on page {url} with exc {exc}\n"))
+            elif (not status and not response.ok) or (status and status != response.status_code):
                 self.stdout.write(self.style.WARNING(f"Error for page {url} with status {response.status_code}.\n"))
-            return response
+        return response
 
-    def request_pagination(self, page, limit):
-        total = Page.objects.descendant_of(page).live().count()
+    def request_pagination(self, site, page, total, limit, query=""):
         num_pages = math.ceil(total / limit)
         for i in range(0, num_pages):
-            self.request_page(
-                url=f"{page.full_url}?ajax=1&page={i + 1}",
-                headers={
-                    "X-Requested-With": "XMLHttpRequest",
-                },
+            self.add_request(
+                site,
+                "pagination",
+                f"{page.full_url}?ajax=1&page={i + 1}{query}",
+                headers=AJAX_HEADERS,
             )
 
-    def request_filtering_collection(self, page, root_collection=None):
+    def get_collections(self, root_collection=None):
+        """
+        Return collections with their number of images, in one grouped query.
+        """
         qs_collection = Collection.objects.all()
         if root_collection:
             qs_collection = qs_collection.descendant_of(root_collection)
 
-        for collection in qs_collection:
-            self.request_page(
-                url=f"{page.full_url}?ajax=1&collection={collection.pk}",
-                headers={
-                    "X-Requested-With": "XMLHttpRequest",
-                },
-            )
-
-    def request_filtering_blog_category(self, site, page, limit):
-        categories = BlogCategory.objects.in_site(site)
+        rows = (
+            get_image_model()
+            .objects.filter(collection__in=qs_collection)
+            .values("collection")
+            .annotate(total=Count("pk"))
+            .order_by("collection")
+        )
+        return [(row["collection"], row["total"]) for row in rows]
 
-        for category in categories:
-            total = BlogPage.objects.descendant_of(page).live().filter(category=category).count()
+    def request_filtering_collection(self, site, page, collections, limit, query=""):
+        for pk, total in collections:
             num_pages = math.ceil(total / limit)
 
             for i in range(0, num_pages):
-                self.request_page(
-                    url=f"{page.full_url}?ajax=1&page={i + 1}&category={category.slug}",
-                    headers={
-                        "X-Requested-With": "XMLHttpRequest",
-                    },
+                self.add_request(
+                    site,
+                    "collection",
+                    f"{page.full_url}?ajax=1&page={i + 1}&collection={pk}{query}",
+                    headers=AJAX_HEADERS,
                 )
 
-    def request_filtering_video_category(self, site, page, limit):
-        categories = VideoCategory.objects.in_site(site)
+    def request_keyset_pagination(self, site, page, limit):
+        """
+        Request chunks of an index page like the infinite scroll does: the
+        first chunk gives the keyset token of the second one, and so on. Tokens
+        are computed at once from the listed pages, without rendering them.
+        """
+        page_model = get_category_models(page.specific_class)[0]
+        qs = (
+            page_model.objects.child_of(page)
+            .live()
+            .filter_language(page.locale.language_code)
+            .select_related("category")
+            .only("date", "category__slug")
+            .order_by("-date", "-pk")
+        )
 
-        for category in categories:
-            total = VideoPage.objects.descendant_of(page).live().filter(category=category).count()
-            num_pages = math.ceil(total / limit)
+        listings = defaultdict(list)
+        for obj in qs:
+            listings[None].append(obj)
+            listings[obj.category.slug].append(obj)
 
-            for i in range(0, num_pages):
-                self.request_page(
-                    url=f"{page.full_url}?ajax=1&page={i + 1}&category={category.slug}",
-                    headers={
-                        "X-Requested-With": "XMLHttpRequest",
-                    },
-                )
+        for slug, objects in listings.items():
+            kind, query = ("category", f"&category={slug}") if slug else ("pagination", "")
+            tokens = [""] + [f"&after={keyset_token(objects[i - 1])}" for i in range(limit, len(objects), limit)]
+            for token in tokens:
+                self.add_request(site, kind, f"{page.full_url}?ajax=1{token}{query}", headers=AJAX_HEADERS)
@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from wagtail.embeds.exceptions import EmbedUnsupportedProviderException
+from wagtail.embeds.finders import get_finders
+from wagtail.embeds.models import Embed
+
+from folioblog.core.utils import socket_timeout
+
+
+def find_embed(url, max_width=None):
+    # Same as embeds.get_embed() but always ask the providers, whatever the
+    # database says (embeds only store their max width).
+    for finder in get_finders():
+        if finder.accept(url):
+            return finder.find_embed(url, max_width=max_width)
+
+    raise EmbedUnsupportedProviderException
+
+
+class Command(BaseCommand):
+    help = "Refresh embeds before they expire, so that visitors never wait for providers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--within",
+            type=int,
+            default=settings.FOLIOBLOG_EMBED_REFRESH_SECONDS,
+            help="Refresh embeds expiring within this number of seconds",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of embeds refreshed at the same time",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=settings.FOLIOBLOG_EMBED_TIMEOUT,
+            help="Timeout of each provider call, in seconds",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("Concurrency must be at least 1.")
+
+        deadline = timezone.now() + timedelta(seconds=options["within"])
+        embeds = list(Embed.objects.filter(cache_until__lte=deadline).order_by("cache_until"))
+
+        failed = 0
+
+        # Only providers are called concurrently, database is updated here.
+        with socket_timeout(options["timeout"]), ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            futures = [(embed, executor.submit(find_embed, embed.url, embed.max_width)) for embed in embeds]
+            for embed, future in futures:
+                try:
+                    self.update_embed(embed, future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"Error on embed {embed.url} with exc {exc!r}"))
+
+        self.stdout.write(self.style.SUCCESS(f"{len(embeds) - failed} embeds refreshed, {failed} failed."))
+
+    def update_embed(self, embed, embed_dict):
+        for field in ["width", "height"]:
+            try:
+                embed_dict[field] = int(embed_dict[field])
+            except (KeyError, TypeError, ValueError):
+                embed_dict[field] = None
+
+        embed_dict["html"] = embed_dict.get("html") or ""
+        embed_dict["thumbnail_url"] = embed_dict.get("thumbnail_url") or ""
+        # Never expires if the provider doesn't say so anymore.
+        embed_dict.setdefault("cache_until", None)
+
+        for field, value in embed_dict.items():
+            setattr(embed, field, value)
+        embed.last_updated = timezone.now()
+        embed.save()
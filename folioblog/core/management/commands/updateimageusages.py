@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from folioblog.core.models import ImageUsage
+
+
+class Command(BaseCommand):
+    help = "Rebuild the image usages of live pages from scratch."
+
+    def handle(self, *args, **options):
+        total = ImageUsage.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"{total} image usages built."))
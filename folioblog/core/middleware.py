@@ -1,13 +1,47 @@
 import logging
+import time
+import uuid
 
+from django.conf import settings
 from django.db import connection
 from django.middleware.cache import FetchFromCacheMiddleware, UpdateCacheMiddleware
+from django.utils.cache import (
+    cc_delim_re,
+    get_conditional_response,
+    get_max_age,
+    patch_response_headers,
+    set_response_etag,
+)
+from django.utils.http import http_date, parse_http_date_safe
+
+from folioblog.core.cache import (
+    acquire_lock,
+    compress_response,
+    decompress_response,
+    get_cache_url,
+    get_page_keys,
+    get_site_id,
+    local_cache,
+    local_cache_key,
+    lock_key,
+    record_dependencies,
+    record_query_params,
+    release_lock,
+    start_tracking,
+    stop_tracking,
+)
 
 
 class AnonymousUpdateCacheMiddleware(UpdateCacheMiddleware):
-    def has_restriction(self, request, response):
+    def get_page(self, response):
         context_data = getattr(response, "context_data", None)
-        page = context_data["page"] if context_data and context_data.get("page") else None
+        return context_data["page"] if context_data and context_data.get("page") else None
+
+    def is_ajax(self, request):
+        return request.headers.get("x-requested-with") == "XMLHttpRequest"
+
+    def has_restriction(self, request, response):
+        page = self.get_page(response)
 
         # Prevent useless queries if we already know that it couldn't be cached.
         if page and self._should_update_cache(request, response):
@@ -16,6 +50,7 @@ class AnonymousUpdateCacheMiddleware(UpdateCacheMiddleware):
         return False
 
     def process_response(self, request, response):
+        collector = stop_tracking()
         is_anonymous = not hasattr(request, "user") or request.user.is_anonymous
         has_restrictions = self.has_restriction(request, response)
 
@@ -23,16 +58,140 @@ class AnonymousUpdateCacheMiddleware(UpdateCacheMiddleware):
             # Remove Vary (Cookie) added by SessionMiddleware
             # @see https://code.djangoproject.com/ticket/29971#comment:4
             # BTW, remove Vary Accept-Language too (rely on path).
-            response.headers.pop("Vary", None)
-            return super().process_response(request, response)
+            vary = [v for v in cc_delim_re.split(response.get("Vary", "")) if v]
+            vary = [v for v in vary if v.lower() not in ("cookie", "accept-language")]
+            if vary:
+                response["Vary"] = ", ".join(vary)
+            else:
+                response.headers.pop("Vary", None)
+            response = self.update_cache(request, response, collector)
+
+        # Whatever happens, let others regenerate it if we failed.
+        if getattr(request, "_cache_lock_key", None):
+            release_lock(request._cache_lock_key)
+
+        return response
+
+    def update_cache(self, request, response, collector):
+        """
+        Mimic UpdateCacheMiddleware.process_response() but with the page keys
+        of the request (i.e: with its site generations) and by recording its
+        dependencies.
+        """
+        if not self._should_update_cache(request, response):
+            return response
+
+        if response.streaming or response.status_code not in (200, 304):
+            return response
+
+        # Don't cache a response with 'Cache-Control: private'
+        if "private" in response.get("Cache-Control", ()):
+            return response
+
+        timeout = get_max_age(response)
+        if timeout is None:
+            timeout = self.cache_timeout
+        elif timeout == 0:
+            return response
+
+        patch_response_headers(response, timeout)
+        if timeout and response.status_code == 200:
+            if hasattr(response, "render") and callable(response.render):
+                response.add_post_render_callback(lambda r: self.store(request, r, timeout, collector))
+            else:
+                self.store(request, response, timeout, collector)
+
+            # Learn which query parameters matter for this page, if known.
+            query_params = getattr(self.get_page(response), "cache_query_params", None)
+            record_query_params(request._cache_site_id, request.path, query_params, timeout)
+
+            if collector and collector.dependencies:
+                # Normalized URL, without any junk of visitors (i.e: to warm it up).
+                url = get_cache_url(request, query_params)
+                pages = {request._cache_keys[0]: (url, self.is_ajax(request))}
+                record_dependencies(request._cache_site_id, pages, collector.dependencies, timeout)
 
         return response
 
+    def store(self, request, response, timeout, collector=None):
+        marker_key, entry_key = request._cache_keys
+
+        # Validators for conditional requests on cache hits.
+        if not response.has_header("ETag"):
+            set_response_etag(response)
+        if collector and collector.last_modified and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(collector.last_modified.timestamp())
+
+        # The entry outlives its marker, to be served stale meanwhile. The
+        # marker holds its version, for local copies to check they are fresh.
+        self.cache.set(entry_key, compress_response(response), timeout + settings.FOLIOBLOG_CACHE_STALE_SECONDS)
+        self.cache.set(marker_key, uuid.uuid4().hex, timeout)
+
 
 class AnonymousFetchCacheMiddleware(FetchFromCacheMiddleware):
     def process_request(self, request):
-        if request.user.is_anonymous:
-            return super().process_request(request)
+        if not request.user.is_anonymous:
+            return None
+
+        if request.method not in ("GET", "HEAD"):
+            request._cache_update_cache = False
+            return None
+
+        # Hottest pages are served by the process itself, without any round trip.
+        response = local_cache.get(local_cache_key(request)) if local_cache.enabled else None
+        if response is not None:
+            return self.serve(request, response)
+
+        request._cache_site_id = get_site_id(request)
+        request._cache_keys = get_page_keys(request, request._cache_site_id)
+
+        marker_key, entry_key = request._cache_keys
+        values = self.cache.get_many([marker_key, entry_key])
+        response = values.get(entry_key)
+
+        if response is None or marker_key not in values:
+            if acquire_lock(marker_key, settings.FOLIOBLOG_CACHE_LOCK_SECONDS):
+                # We are the only one allowed to (re)generate it.
+                request._cache_lock_key = marker_key
+                response = None
+            elif response is None or not settings.FOLIOBLOG_CACHE_STALE_SECONDS:
+                # Another worker is already building it, so just wait for it.
+                response = self.wait(marker_key, entry_key)
+            # Otherwise, keep serving the stale one while another worker regenerates it.
+
+        if response is None:
+            # Cache miss, so keep track of any objects used to build it.
+            request._cache_update_cache = True
+            start_tracking()
+            return None
+
+        if local_cache.enabled and marker_key in values:
+            local_cache.set(local_cache_key(request), response)
+        return self.serve(request, response)
+
+    def serve(self, request, response):
+        request._cache_update_cache = False
+        response = decompress_response(response, request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        return get_conditional_response(
+            request,
+            etag=response.get("ETag"),
+            last_modified=parse_http_date_safe(response.get("Last-Modified")),
+            response=response,
+        )
+
+    def wait(self, marker_key, entry_key):
+        deadline = time.monotonic() + settings.FOLIOBLOG_CACHE_LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+
+            values = self.cache.get_many([marker_key, entry_key, lock_key(marker_key)])
+            if marker_key in values and entry_key in values:
+                return values[entry_key]
+            # Lock released without storing anything (i.e: not cacheable).
+            if lock_key(marker_key) not in values:
+                break
+
+        return None
 
 
 class CountQueriesMiddleware:
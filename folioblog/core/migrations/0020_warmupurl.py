@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_alter_folioblogsettings_email"),
+        ("wagtailcore", "0093_uploadedfile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WarmupURL",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("url", models.CharField(max_length=2048, unique=True)),
+                ("ajax", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "site",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="%(app_label)s_%(class)s",
+                        related_query_name="%(app_label)s_%(class)ss",
+                        to="wagtailcore.site",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "warm-up URL",
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_warmupurl"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="folioblogsettings",
+            name="gallery_pager_limit",
+            field=models.PositiveSmallIntegerField(default=40),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_folioblogsettings_gallery_pager_limit"),
+        ("wagtailcore", "0093_uploadedfile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageUsage",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("caption", models.TextField(blank=True, default="")),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="core.folioimage"
+                    ),
+                ),
+                (
+                    "locale",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="wagtailcore.locale"
+                    ),
+                ),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="wagtailcore.page"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["image", "locale"], name="core_imageu_image_i_c778e1_idx")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="imageusage",
+            constraint=models.UniqueConstraint(fields=("image", "page"), name="unique_image_usage"),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import html
+import re
+
+from django.db import migrations
+
+# Frozen copies of the page models and of the rich text parsing, for this
+# migration to keep working whatever they become.
+PAGE_MODELS = ["blog.BlogPage", "core.BasicPage", "video.VideoPage"]
+FIND_EMBED_TAG = re.compile(r"<embed(\b[^>]*)/>")
+FIND_ATTRS = re.compile(r'([\w-]+)\="([^"]*)"')
+
+
+def extract_usages(page):
+    captions = {}
+
+    for match in FIND_EMBED_TAG.findall(page.body):
+        attrs = {name: html.unescape(value) for name, value in FIND_ATTRS.findall(match)}
+        if attrs.get("embedtype") == "image" and attrs.get("id", "").isdigit():
+            captions.setdefault(int(attrs["id"]), attrs.get("alt") or "")
+
+    for field in page._meta.concrete_fields:
+        if field.is_relation and field.related_model._meta.label == "core.FolioImage" and getattr(page, field.attname):
+            captions[getattr(page, field.attname)] = page.image_alt if field.name == "image" else ""
+
+    return captions
+
+
+def build_image_usages(apps, schema_editor):
+    FolioImage = apps.get_model("core", "FolioImage")
+    ImageUsage = apps.get_model("core", "ImageUsage")
+
+    usages = []
+    for label in PAGE_MODELS:
+        for page in apps.get_model(label).objects.filter(live=True):
+            for image_id, caption in extract_usages(page).items():
+                usages.append(
+                    ImageUsage(image_id=image_id, page_id=page.pk, locale_id=page.locale_id, caption=caption)
+                )
+
+    # Embedded images may not exist anymore.
+    image_ids = set(FolioImage.objects.values_list("pk", flat=True))
+    ImageUsage.objects.bulk_create([u for u in usages if u.image_id in image_ids], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0010_keyset_index"),
+        ("core", "0022_imageusage"),
+        ("video", "0011_keyset_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_image_usages, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
 from pathlib import Path
 
+from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from django.utils.translation import get_language
@@ -18,8 +20,16 @@ from wagtail.contrib.settings.models import BaseSiteSetting
 from wagtail.contrib.settings.registry import register_setting
 from wagtail.fields import RichTextField, StreamField
 from wagtail.images.api.v2.serializers import ImageDownloadUrlField
-from wagtail.images.models import AbstractImage, AbstractRendition, Image, ImageQuerySet
-from wagtail.models import Collection, Orderable, Page, Site, TranslatableMixin
+from wagtail.images.models import (
+    AbstractImage,
+    AbstractRendition,
+    Filter,
+    Image,
+    ImageQuerySet,
+    SourceImageIOError,
+)
+from wagtail.images.shortcuts import get_rendition_or_not_found
+from wagtail.models import Collection, Locale, Orderable, Page, Site, TranslatableMixin
 
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
@@ -31,7 +41,9 @@ from folioblog.core.managers import (
     ImageManager,
     MultiSiteManager,
 )
+from folioblog.core.renditions import get_specs
 from folioblog.core.sitemap import SitemapPageMixin
+from folioblog.core.utils.richtext import richtext_extract_images
 
 
 class MultiSiteMixin(models.Model):
@@ -104,6 +116,43 @@ class FolioImage(AbstractImage):
 
         return mark_safe(output)
 
+    @classmethod
+    def get_bulk_renditions(cls, images, role):
+        """
+        Return renditions of an image role for many images at once, keyed by
+        image ids then names (@see folioblog.core.renditions). Existing ones
+        are fetched in one query, missing ones are created in a batch per
+        image (i.e: its original is read once).
+        """
+        Rendition = cls.get_rendition_model()
+        specs = {image.pk: get_specs(image, role) for image in images}
+        filters = {spec: Filter(spec) for image_specs in specs.values() for spec in image_specs.values()}
+
+        existing = {}
+        qs = Rendition.objects.filter(image__in=list(specs), filter_spec__in=list(filters))
+        for rendition in qs:
+            existing[(rendition.image_id, rendition.filter_spec, rendition.focal_point_key)] = rendition
+
+        renditions = {}
+        for image in images:
+            found = {}
+            for spec in specs[image.pk].values():
+                rendition = existing.get((image.pk, spec, filters[spec].get_cache_key(image)))
+                if rendition:
+                    rendition.image = image  # Prevent a query per rendition.
+                    found[spec] = rendition
+
+            missing = [filters[spec] for spec in specs[image.pk].values() if spec not in found]
+            if missing:
+                try:
+                    found.update({f.spec: r for f, r in image.create_renditions(*dict.fromkeys(missing)).items()})
+                except SourceImageIOError:
+                    found.update({f.spec: get_rendition_or_not_found(image, f) for f in missing})
+
+            renditions[image.pk] = {name: found[spec] for name, spec in specs[image.pk].items()}
+
+        return renditions
+
     def save(self, *args, **kwargs):
         original = self._meta.model.objects.get(pk=self.pk) if self.pk else None
         super().save(*args, **kwargs)
@@ -349,6 +398,7 @@ class FolioBlogSettings(BaseSiteSetting):
         on_delete=models.SET_NULL,
         related_name="+",
     )
+    gallery_pager_limit = models.PositiveSmallIntegerField(default=40)
 
     search_limit = models.PositiveSmallIntegerField(default=10)
     search_operator = models.CharField(
@@ -406,6 +456,7 @@ class FolioBlogSettings(BaseSiteSetting):
     ]
     gallery_panels = [
         FieldPanel("gallery_collection"),
+        FieldPanel("gallery_pager_limit"),
     ]
     search_panels = [
         FieldPanel("search_limit"),
@@ -475,3 +526,98 @@ class MenuLink(Orderable):
     panels = [
         FieldPanel("related_page"),
     ]
+
+
+class WarmupURL(MultiSiteMixin, models.Model):
+    """
+    Queue of cache pages evicted by content changes, to warm them up again.
+    """
+
+    url = models.CharField(max_length=2048, unique=True)
+    ajax = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "warm-up URL"
+
+    def __str__(self):
+        return self.url
+
+
+class ImageUsage(models.Model):
+    """
+    Denormalized usages of images by live pages, with their captions, to be
+    read in one query instead of parsing pages on each request (i.e: gallery).
+    Kept up to date on page save, or rebuilt by the updateimageusages command.
+    """
+
+    image = models.ForeignKey(FolioImage, on_delete=models.CASCADE, related_name="+")
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="+")
+    locale = models.ForeignKey(Locale, on_delete=models.CASCADE, related_name="+")
+    caption = models.TextField(blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["image", "page"], name="unique_image_usage"),
+        ]
+        indexes = [
+            models.Index(fields=["image", "locale"]),
+        ]
+
+    def __str__(self):
+        return f"{self.image_id} - {self.page_id}"
+
+    @classmethod
+    def extract_usages(cls, page):
+        """
+        Return captions of images used by a page, keyed by image ids.
+        """
+        captions = {}
+
+        for image_id, attrs in richtext_extract_images(page.body).items():
+            captions[image_id] = attrs.get("alt") or ""
+
+        for field in page._meta.concrete_fields:
+            if field.is_relation and field.related_model is FolioImage and getattr(page, field.attname):
+                captions[getattr(page, field.attname)] = page.image_alt if field.name == "image" else ""
+
+        return captions
+
+    @classmethod
+    def get_usages(cls, page):
+        if not page.live:
+            return []
+
+        return [
+            cls(image_id=image_id, page=page, locale_id=page.locale_id, caption=caption)
+            for image_id, caption in cls.extract_usages(page).items()
+        ]
+
+    @classmethod
+    def update_for_page(cls, page):
+        cls.objects.filter(page=page).delete()
+        # Embedded images may not exist anymore.
+        usages = cls.get_usages(page)
+        image_ids = set(FolioImage.objects.filter(pk__in=[u.image_id for u in usages]).values_list("pk", flat=True))
+        cls.objects.bulk_create([u for u in usages if u.image_id in image_ids])
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Rebuild usages of all live pages from scratch, returning their number.
+        """
+        usages = []
+        for Model in apps.get_models():
+            if issubclass(Model, BasePage):
+                for page in Model.objects.live():
+                    usages += cls.get_usages(page)
+
+        # Embedded images may not exist anymore.
+        image_ids = set(FolioImage.objects.values_list("pk", flat=True))
+        usages = [u for u in usages if u.image_id in image_ids]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(usages, batch_size=500)
+
+        return len(usages)
@@ -1,4 +1,23 @@
+import datetime
+
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def keyset_token(obj):
+    # Opaque position of an object ordered by date and pk, both descending.
+    return urlsafe_base64_encode(f"{obj.date.isoformat()},{obj.pk}".encode())
+
+
+def keyset_filter(token):
+    try:
+        date, pk = urlsafe_base64_decode(token).decode().split(",")
+        position = datetime.date.fromisoformat(date), int(pk)
+    except (TypeError, ValueError):
+        return Q()  # first page if invalid, like page numbers
+
+    return Q(date__lt=position[0]) | Q(date=position[0], pk__lt=position[1])
 
 
 class FolioBlogPaginator(Paginator):
@@ -11,3 +30,23 @@ class FolioBlogPaginator(Paginator):
             return []  # return nothing instead of latests (for infinite-scroll)
 
         return self.page(number)
+
+    def get_page_after(self, number, after=None):
+        """
+        Return objects of a page, or those following a keyset token if any,
+        with the token of the next ones if there is more.
+
+        Unlike page numbers, keyset tokens only need a range scan of an index
+        on (date, pk), without any count nor offset. Without both, the first
+        objects are fetched the same way.
+        """
+        if after is None and number is not None:
+            objects = self.get_page(number)
+            has_next = bool(objects) and objects.has_next()
+        else:
+            qs = self.object_list if after is None else self.object_list.filter(keyset_filter(after))
+            objects = list(qs[: self.per_page + 1])
+            has_next = len(objects) > self.per_page
+            objects = objects[: self.per_page]
+
+        return objects, keyset_token(objects[-1]) if has_next else None
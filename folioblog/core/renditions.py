@@ -0,0 +1,229 @@
+from itertools import chain
+
+from django.apps import apps
+
+from wagtail.images.models import SourceImageIOError
+from wagtail.images.shortcuts import get_rendition_or_not_found
+
+from folioblog.core.utils.richtext import richtext_extract_images
+
+# Rendition specs per image role, keyed by their template variable names.
+# Roles suffixed by an orientation are picked according to the image one.
+SPECS = {
+    # Headers
+    "background": {
+        "bg_xs_3x": "fill-1080x1380",
+        "bg_lg_1x": "fill-1905x560",
+    },
+    "background_article": {
+        "bg_xs_3x": "fill-1080x2300",
+        "bg_lg_1x": "fill-1905x830",
+    },
+    "background_agency": {
+        "bg_xs_3x": "fill-1080x1626",
+        "bg_lg_1x": "fill-1905x745",
+    },
+    "og_portrait": {
+        "og_image": "fill-1260x2400|format-jpeg",
+    },
+    "og_landscape": {
+        "og_image": "fill-2400x1260|format-jpeg",
+    },
+    # Pages
+    "basic_page": {
+        "image_lg_1x": "width-700",
+        "image_xs_3x": "width-940",
+        "image_full": "width-1920|format-jpeg",
+    },
+    "image_switch": {
+        "image_xs_3x": "width-936",
+        "image_lg_1x": "width-700",
+        "image_full": "width-1920|format-jpeg",
+    },
+    "image_switch_body": {
+        "image_xs_3x_switch": "width-936",
+        "image_lg_1x_switch": "width-700",
+    },
+    "youtube_player": {
+        "thumbnail_xs": "fill-940x710|format-webp",
+        "thumbnail_lg": "fill-700x530|format-webp",
+    },
+    "richtext": {
+        "image": "width-940",
+        "image_full": "width-1920|format-jpeg",
+    },
+    # Lists
+    "blog_index_item": {
+        "image_lg_1x": "fill-460x310",
+        "image_xs_3x": "fill-1010x675",
+    },
+    "blog_promoted": {
+        "image_xs_3x": "fill-805x1610",
+        "image_lg_1x": "fill-960x720",
+    },
+    "video_promoted": {
+        "thumbnail_preview": "fill-80x80|format-webp",
+        "thumbnail_xs": "fill-940x710|format-webp",
+        "thumbnail_lg": "fill-700x530|format-webp",
+    },
+    "related_page": {
+        "related_image": "fill-150x150",
+    },
+    "search_result": {
+        "image_xs_3x": "width-936",
+        "image_lg_1x": "width-700",
+    },
+    "rss": {
+        "image": "max-400x400|format-jpeg",
+    },
+    "gallery_portrait": {
+        "image_xs_3x": "fill-320x440",
+        "image_xs_3x_zoom": "fill-640x880",
+        "image_lg_1x": "fill-465x620",
+        "image_lg_1x_zoom": "fill-930x1240",
+        "image_full": "width-1920|format-jpeg",
+    },
+    "gallery_landscape": {
+        "image_xs_3x": "fill-320x250",
+        "image_xs_3x_zoom": "fill-640x500",
+        "image_lg_1x": "fill-468x351",
+        "image_lg_1x_zoom": "fill-937x703",
+        "image_full": "width-1920|format-jpeg",
+    },
+    # Blocks
+    "experience": {
+        "photo": "fill-156x156",
+    },
+    "skill": {
+        "skill_image": "fill-600x450",
+    },
+    "team_member": {
+        "img_lg_1x": "fill-208x208",
+        "img_xs_3x": "fill-624x624",
+    },
+}
+
+# Image roles of each page type, per image field.
+PAGES = {
+    "blog.BlogIndexPage": {
+        "image": ["background", "og"],
+    },
+    "blog.BlogPage": {
+        "image": [
+            "background_article",
+            "og",
+            "image_switch",
+            "blog_index_item",
+            "blog_promoted",
+            "related_page",
+            "search_result",
+            "rss",
+        ],
+        "image_body": ["image_switch_body"],
+    },
+    "core.BasicPage": {
+        "image": ["background", "og", "basic_page", "related_page"],
+    },
+    "gallery.GalleryPage": {
+        "image": ["background", "og"],
+    },
+    "home.HomePage": {
+        "image": ["background", "og"],
+    },
+    "portfolio.PortfolioPage": {
+        "header_slide": ["background_agency", "og"],
+    },
+    "search.SearchIndexPage": {
+        "image": ["background", "og"],
+    },
+    "video.VideoIndexPage": {
+        "image": ["background", "og"],
+    },
+    "video.VideoPage": {
+        "image": ["background", "og", "related_page"],
+        "thumbnail": ["youtube_player", "video_promoted"],
+    },
+}
+
+# Image roles of each page type, per rich text field.
+RICHTEXTS = {
+    "blog.BlogPage": {"body": ["richtext"]},
+    "core.BasicPage": {"body": ["richtext"]},
+    "video.VideoPage": {"body": ["richtext"]},
+}
+
+# Image roles of each page type, per stream field and image block of their
+# items.
+BLOCKS = {
+    "portfolio.PortfolioPage": {
+        "cv_experiences": {"photo": ["experience"]},
+        "skills": {"image": ["skill"]},
+        "team_members": {"photo": ["team_member"]},
+    },
+}
+
+# Same for site settings.
+SETTINGS = {
+    "image_password": ["background"],
+    "image_404": ["background"],
+}
+
+
+def get_specs(image, role):
+    orientation = "portrait" if image.is_portrait() else "landscape"
+    return SPECS.get(f"{role}_{orientation}") or SPECS[role]
+
+
+def get_renditions(image, role):
+    """
+    Return renditions of an image role keyed by their names, all at once.
+    """
+    specs = get_specs(image, role)
+    try:
+        renditions = image.get_renditions(*specs.values())
+    except SourceImageIOError:
+        renditions = {spec: get_rendition_or_not_found(image, spec) for spec in specs.values()}
+
+    return {name: renditions[spec] for name, spec in specs.items()}
+
+
+def iter_field_images():
+    models = [(apps.get_model(label).objects.live(), fields) for label, fields in PAGES.items()]
+    models.append((apps.get_model("core.FolioBlogSettings").objects.all(), SETTINGS))
+    for qs, fields in models:
+        for row in qs.values(*fields):
+            for field, pk in row.items():
+                if pk:
+                    yield pk, fields[field]
+
+
+def iter_richtext_images():
+    for label, fields in RICHTEXTS.items():
+        for row in apps.get_model(label).objects.live().values(*fields):
+            for field, html in row.items():
+                for pk in richtext_extract_images(html):
+                    yield pk, fields[field]
+
+
+def iter_block_images():
+    # Raw data of stream fields hold image ids, without fetching images.
+    for label, fields in BLOCKS.items():
+        for row in apps.get_model(label).objects.live().values(*fields):
+            for field, stream in row.items():
+                for item in stream.raw_data if stream else []:
+                    for name, roles in fields[field].items():
+                        if item["value"].get(name):
+                            yield item["value"][name], roles
+
+
+def get_image_roles():
+    """
+    Return roles of images used by live pages and site settings, keyed by
+    image ids.
+    """
+    roles = {}
+
+    for pk, image_roles in chain(iter_field_images(), iter_richtext_images(), iter_block_images()):
+        roles.setdefault(pk, set()).update(image_roles)
+
+    return roles
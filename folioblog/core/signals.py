@@ -1,18 +1,55 @@
-from django.core.cache import cache
+from django.conf import settings
 
-from wagtail.contrib.settings.models import BaseGenericSetting
-from wagtail.images.models import AbstractImage
-from wagtail.models import Page
-from wagtail.snippets.models import get_snippet_models
+from wagtail.models import Site
 
-from taggit.models import TagBase
+from folioblog.core.cache import (
+    clear_sites,
+    get_tracked_models,
+    invalidate_instance,
+    invalidate_site,
+)
+from folioblog.core.categories import update_category_stats
+from folioblog.core.models import BasePage, ImageUsage, WarmupURL
 
 
-def clear_cache_page(sender, **kwargs):
-    # No matter which model instance is added/edit/deleted... clear ALL cache
-    # to avoid cascading behavior! In that way, we could have a huge cache
-    # duration if no changes are done for a looooong time!
+def clear_cache_page(sender, instance, **kwargs):
+    # Only evict cache pages which have used this instance (or which list
+    # this kind of instance), scoped to its site. Everything else is kept, so
+    # we could still have a huge cache duration even with editorial activity.
     # Furthermore, changes are applied... immediatly!
-    subclasses = tuple([Page, TagBase, AbstractImage, BaseGenericSetting] + get_snippet_models())
-    if issubclass(sender, subclasses):
-        cache.clear()
+    # Partial saves (i.e: new revisions) don't change what is rendered.
+    if kwargs.get("update_fields") is not None:
+        return
+
+    if issubclass(sender, get_tracked_models()):
+        pages = invalidate_instance(instance, created=kwargs.get("created", False))
+        if pages and settings.FOLIOBLOG_CACHE_WARMUP_QUEUE:
+            # Then queue them to be warmed up again (loadcachepages --incremental),
+            # except URLs too long to be worth it (i.e: unknown query strings).
+            max_length = WarmupURL._meta.get_field("url").max_length
+            WarmupURL.objects.bulk_create(
+                [
+                    WarmupURL(site_id=site_id, url=url, ajax=ajax)
+                    for site_id, url, ajax in pages.values()
+                    if len(url) <= max_length
+                ],
+                update_conflicts=True,
+                unique_fields=["url"],
+                update_fields=["site", "ajax", "created_at"],
+            )
+    # Hostname or root page may have changed, so drop the whole site.
+    elif issubclass(sender, Site):
+        clear_sites()
+        invalidate_site(instance.pk)
+
+
+def update_categories(sender, instance, **kwargs):
+    # Live pages are only changed by full saves (i.e: publish, unpublish).
+    if not kwargs.get("raw") and kwargs.get("update_fields") is None:
+        update_category_stats(sender, instance)
+
+
+def update_image_usages(sender, instance, **kwargs):
+    # Partial saves (i.e: new revisions) don't change the live content.
+    if issubclass(sender, BasePage) and not kwargs.get("raw") and kwargs.get("update_fields") is None:
+        ImageUsage.update_for_page(instance)
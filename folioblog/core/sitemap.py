@@ -1,8 +1,9 @@
 from django.conf import settings
 
 from wagtail.contrib.sitemaps.sitemap_generator import Sitemap as WagtailSitemap
-from wagtail.models import Page
+from wagtail.models import Page, get_page_models
 
+from folioblog.core.cache import collect_listing
 from folioblog.core.managers import qs_in_site_alt
 
 
@@ -41,5 +42,6 @@ class Sitemap(WagtailSitemap):
     def items(self):
         qs = Page.objects.live().public().order_by("path").defer_streamfields().specific()
         qs = qs_in_site_alt(qs, self.get_wagtail_site())
+        collect_listing(*get_page_models())
 
         return qs
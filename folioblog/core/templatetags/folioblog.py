@@ -17,6 +17,7 @@ from django_social_share.templatetags.social_share import (
 from django_social_share.templatetags.social_share import urlencode as tpl_urlencode
 
 from folioblog.core.models import Photographer
+from folioblog.core.renditions import SPECS, get_renditions
 from folioblog.core.utils import get_block_language
 
 register = template.Library()
@@ -72,11 +73,25 @@ def cookies_banner(context):
 
 
 @register.inclusion_tag("core/background.html")
-def background_style(image, xs_3x_spec="fill-1080x1380", lg_1x_spec="fill-1905x560"):
-    return {
-        "bg_xs_3x": image.get_rendition(xs_3x_spec),
-        "bg_lg_1x": image.get_rendition(lg_1x_spec),
-    }
+def background_style(image, role="background"):
+    return get_renditions(image, role)
+
+
+@register.simple_tag(takes_context=True)
+def renditions(context, image, role):
+    """
+    Like {% image %} with 'as', but set all the renditions of an image role
+    (@see folioblog.core.renditions.SPECS) under their names.
+    """
+    if image:
+        values = get_renditions(image, role)
+    else:
+        values = dict.fromkeys(SPECS.get(role) or SPECS[f"{role}_landscape"])
+
+    # Set in the current scope, not in a new one.
+    for name, rendition in values.items():
+        context[name] = rendition
+    return ""
 
 
 @register.inclusion_tag("core/credits.html", takes_context=True)
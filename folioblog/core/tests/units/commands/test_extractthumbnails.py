@@ -0,0 +1,154 @@
+import socket
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from wagtail.images.tests.utils import get_test_image_file
+
+import requests_mock
+from wagtail_factories import CollectionFactory
+
+from folioblog.video.factories import VideoIndexPageFactory, VideoPageFactory
+from folioblog.video.models import ThumbnailJob, VideoPage
+
+
+@override_settings(FOLIOBLOG_VIDEO_THUMBNAIL_RETRY_SECONDS=60, FOLIOBLOG_VIDEO_THUMBNAIL_MAX_ATTEMPTS=3)
+class ExtractThumbnailsCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.collection = CollectionFactory(name="Video thumbnail")
+        cls.index = VideoIndexPageFactory()
+
+    def setUp(self):
+        self.mock_request = requests_mock.Mocker()
+        self.mock_request.start()
+
+    def tearDown(self):
+        self.mock_request.stop()
+
+    def create_page(self, status_code=200, **kwargs):
+        page = VideoPageFactory(parent=self.index, thumbnail=None, **kwargs)
+        self.mock_request.get(
+            page.embed.thumbnail_url,
+            content=get_test_image_file().file.getvalue(),
+            status_code=status_code,
+        )
+        return page
+
+    def test_extract(self):
+        page = self.create_page()
+        page.save_revision()
+
+        out = StringIO()
+        call_command("extractthumbnails", stdout=out)
+
+        page.refresh_from_db()
+        self.assertEqual(page.thumbnail.collection, self.collection)
+        self.assertFalse(ThumbnailJob.objects.exists())
+        self.assertIn("1 thumbnails extracted, 0 failed.", out.getvalue())
+
+    def test_already_attached(self):
+        page = self.create_page()
+        page.save_revision()
+        VideoPage.objects.filter(pk=page.pk).update(thumbnail=VideoPageFactory(parent=self.index).thumbnail)
+
+        out = StringIO()
+        call_command("extractthumbnails", stdout=out)
+
+        self.assertFalse(ThumbnailJob.objects.exists())
+        self.assertFalse(self.mock_request.called)
+
+    def test_retry(self):
+        page = self.create_page(status_code=500)
+        page.save_revision()
+
+        out = StringIO()
+        with self.assertLogs("folioblog.video.models", level="WARNING"):
+            call_command("extractthumbnails", stdout=out)
+
+        job = ThumbnailJob.objects.get(page=page)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.scheduled_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn(f"No thumbnail for page {page.pk}, attempt 1.", out.getvalue())
+        self.assertIn("0 thumbnails extracted, 1 failed.", out.getvalue())
+
+        # Not yet.
+        call_command("extractthumbnails", stdout=StringIO())
+        self.assertEqual(ThumbnailJob.objects.get(page=page).attempts, 1)
+
+        ThumbnailJob.objects.update(scheduled_at=timezone.now())
+        with self.assertLogs("folioblog.video.models", level="WARNING"):
+            call_command("extractthumbnails", stdout=StringIO())
+        job = ThumbnailJob.objects.get(page=page)
+        self.assertEqual(job.attempts, 2)
+        self.assertGreater(job.scheduled_at, timezone.now() + timedelta(seconds=110))
+
+    def test_max_attempts(self):
+        page = self.create_page()
+        ThumbnailJob.objects.create(page=page, attempts=3)
+
+        call_command("extractthumbnails", stdout=StringIO())
+        self.assertEqual(ThumbnailJob.objects.get(page=page).attempts, 3)
+
+        call_command("extractthumbnails", "--max-attempts", 4, stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+
+    def test_exception(self):
+        page = self.create_page()
+        page.save_revision()
+
+        out = StringIO()
+        with mock.patch.object(VideoPage, "extract_thumbnail", side_effect=TimeoutError("timed out")):
+            call_command("extractthumbnails", stdout=out)
+
+        self.assertIn(f"Error on thumbnail of page {page.pk} with exc timed out", out.getvalue())
+        self.assertEqual(ThumbnailJob.objects.get(page=page).attempts, 1)
+
+    def test_timeout(self):
+        page = self.create_page()
+        page.save_revision()
+
+        def extract_thumbnail(collection, timeout):
+            self.assertEqual(socket.getdefaulttimeout(), 3)
+            self.assertEqual(timeout, 3)
+
+        default_timeout = socket.getdefaulttimeout()
+        with mock.patch.object(VideoPage, "extract_thumbnail", side_effect=extract_thumbnail):
+            call_command("extractthumbnails", "--timeout", 3, stdout=StringIO())
+        self.assertEqual(socket.getdefaulttimeout(), default_timeout)
+
+    def test_limit(self):
+        for i in range(3):
+            self.create_page().save_revision()
+
+        out = StringIO()
+        call_command("extractthumbnails", "--limit", 2, stdout=out)
+
+        self.assertEqual(ThumbnailJob.objects.count(), 1)
+        self.assertIn("2 thumbnails extracted, 0 failed.", out.getvalue())
+
+    def test_backfill(self):
+        pages = [self.create_page() for i in range(2)]
+        pages[0].save_revision()
+        VideoPageFactory(parent=self.index)
+
+        out = StringIO()
+        call_command("extractthumbnails", "--backfill", "--limit", 0, stdout=out)
+
+        self.assertIn("1 video pages queued", out.getvalue())
+        self.assertCountEqual(ThumbnailJob.objects.values_list("page_id", flat=True), [p.pk for p in pages])
+
+    def test_backfill_given_up(self):
+        page = self.create_page()
+        ThumbnailJob.objects.create(page=page, attempts=3)
+        ThumbnailJob.objects.create(page=self.create_page(), attempts=1)
+
+        out = StringIO()
+        call_command("extractthumbnails", "--backfill", "--limit", 0, stdout=out)
+
+        self.assertIn("1 video pages queued", out.getvalue())
+        self.assertEqual(ThumbnailJob.objects.get(page=page).attempts, 0)
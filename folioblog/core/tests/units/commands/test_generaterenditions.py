@@ -1,20 +1,33 @@
 from io import StringIO
+from unittest import mock
 
 from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from wagtail.images import get_image_model
 from wagtail.models import Site
 
 from wagtail_factories import CollectionFactory, SiteFactory
 
-from folioblog.core.factories import FolioBlogSettingsFactory, ImageFactory
+from folioblog.blog.factories import BlogIndexPageFactory, BlogPageFactory
+from folioblog.core.factories import (
+    BasicPageFactory,
+    FolioBlogSettingsFactory,
+    ImageFactory,
+)
 from folioblog.core.models import FolioBlogSettings
-from folioblog.gallery.templatetags.gallery import SPECS_LANDSCAPE, SPECS_PORTRAIT
+from folioblog.core.renditions import PAGES, SPECS, get_specs
+from folioblog.core.utils.tests.units import SyncExecutor
+from folioblog.portfolio.factories import PortfolioPageFactory
 
 Image = get_image_model()
 Rendition = Image.get_rendition_model()
 
+SPECS_PORTRAIT = SPECS["gallery_portrait"]
+SPECS_LANDSCAPE = SPECS["gallery_landscape"]
+
 
 class GenerateRenditionsCommandTestCase(TestCase):
     @classmethod
@@ -49,3 +62,120 @@ class GenerateRenditionsCommandTestCase(TestCase):
         call_command("generaterenditions", stdout=out)
         self.assertIn(f"Skip generating renditions for site {self.site_other}", out.getvalue())
         self.assertIn(f"{count} renditions generated for site {self.site}", out.getvalue())
+        self.assertIn("Progress: 2/2 images", out.getvalue())
+        self.assertEqual(Rendition.objects.count(), count)
+
+    def test_generate_rendition_batches(self):
+        ImageFactory.create_batch(3, collection=self.child_collection, file__width=500, file__height=300)
+
+        out = StringIO()
+        call_command("generaterenditions", batch_size=2, stdout=out)
+        self.assertIn("Progress: 2/3 images", out.getvalue())
+        self.assertIn("Progress: 3/3 images", out.getvalue())
+        self.assertIn(f"{len(SPECS_LANDSCAPE) * 3} renditions generated for site {self.site}", out.getvalue())
+        self.assertEqual(Rendition.objects.count(), len(SPECS_LANDSCAPE) * 3)
+
+    def test_generate_rendition_open_once(self):
+        image = ImageFactory(collection=self.child_collection, file__width=500, file__height=300)
+
+        with mock.patch.object(Image, "open_file", autospec=True, side_effect=Image.open_file) as m:
+            call_command("generaterenditions", stdout=StringIO())
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(image.renditions.count(), len(SPECS_LANDSCAPE))
+
+    @mock.patch("folioblog.core.management.commands.generaterenditions.connections.close_all")
+    @mock.patch("folioblog.core.management.commands.generaterenditions.ProcessPoolExecutor", SyncExecutor)
+    def test_generate_rendition_workers(self, mock_close_all):
+        ImageFactory.create_batch(3, collection=self.child_collection, file__width=500, file__height=300)
+
+        out = StringIO()
+        call_command("generaterenditions", workers=4, batch_size=1, stdout=out)
+
+        mock_close_all.assert_called_once()
+        self.assertIn("Progress: 3/3 images", out.getvalue())
+        self.assertIn(f"{len(SPECS_LANDSCAPE) * 3} renditions generated for site {self.site}", out.getvalue())
+
+    def test_generate_rendition_pages(self):
+        image = ImageFactory(file__width=500, file__height=300)
+        image_body = ImageFactory(file__width=500, file__height=300)
+        image_draft = ImageFactory(file__width=500, file__height=300)
+        index = BlogIndexPageFactory(parent=self.site.root_page, image=image)
+        BlogPageFactory(parent=index, image=image, image_body=image_body)
+        BlogPageFactory(parent=index, image=image_draft, live=False)
+
+        out = StringIO()
+        call_command("generaterenditions", pages=True, stdout=out)
+        self.assertIn("renditions generated for pages", out.getvalue())
+
+        # Roles of both pages using it.
+        roles = PAGES["blog.BlogIndexPage"]["image"] + PAGES["blog.BlogPage"]["image"]
+        specs = {spec for role in roles for spec in get_specs(image, role).values()}
+        self.assertSetEqual(set(image.renditions.values_list("filter_spec", flat=True)), specs)
+        self.assertSetEqual(
+            set(image_body.renditions.values_list("filter_spec", flat=True)),
+            set(SPECS["image_switch_body"].values()),
+        )
+        self.assertFalse(image_draft.renditions.exists())
+
+    def test_generate_rendition_pages_embedded(self):
+        image_body = ImageFactory(file__width=500, file__height=300)
+        image_skill = ImageFactory(file__width=500, file__height=300)
+        BasicPageFactory(
+            parent=self.site.root_page,
+            body=f'<p>foo</p><embed alt="bar" embedtype="image" format="bodyfullfuild" id="{image_body.pk}"/>',
+        )
+        PortfolioPageFactory(
+            parent=self.site.root_page,
+            skills__0__skill__image__image=image_skill,
+            skills__0__skill__links__0__page=None,
+            cv_experiences=[],
+            team_members=[],
+        )
+
+        call_command("generaterenditions", pages=True, stdout=StringIO())
+        self.assertSetEqual(
+            set(image_body.renditions.values_list("filter_spec", flat=True)),
+            set(SPECS["richtext"].values()),
+        )
+        self.assertSetEqual(
+            set(image_skill.renditions.values_list("filter_spec", flat=True)),
+            set(SPECS["skill"].values()),
+        )
+
+    def test_generate_rendition_incremental(self):
+        image = ImageFactory(collection=self.child_collection, file__width=500, file__height=300)
+        # Focal point keys of fill specs must match too.
+        image_focal = ImageFactory(
+            collection=self.child_collection,
+            file__width=500,
+            file__height=300,
+            focal_point_x=100,
+            focal_point_y=100,
+            focal_point_width=50,
+            focal_point_height=50,
+        )
+        call_command("generaterenditions", stdout=StringIO())
+        image.renditions.filter(filter_spec=SPECS_LANDSCAPE["image_full"]).delete()
+
+        out = StringIO()
+        with mock.patch.object(Image, "get_renditions", autospec=True, side_effect=Image.get_renditions) as m:
+            call_command("generaterenditions", incremental=True, stdout=out)
+
+        self.assertIn("1 images with missing renditions", out.getvalue())
+        self.assertIn(f"1 renditions generated for site {self.site}", out.getvalue())
+        m.assert_called_once_with(image, SPECS_LANDSCAPE["image_full"])
+        self.assertEqual(image.renditions.count(), len(SPECS_LANDSCAPE))
+        self.assertEqual(image_focal.renditions.count(), len(SPECS_LANDSCAPE))
+
+    def test_generate_rendition_incremental_nothing(self):
+        ImageFactory.create_batch(3, collection=self.child_collection, file__width=500, file__height=300)
+        call_command("generaterenditions", stdout=StringIO())
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as cm:
+            call_command("generaterenditions", incremental=True, stdout=out)
+
+        self.assertIn("0 images with missing renditions", out.getvalue())
+        self.assertIn(f"0 renditions generated for site {self.site}", out.getvalue())
+        # Sites and their settings, then images and their renditions.
+        self.assertLessEqual(len(cm.captured_queries), 8)
@@ -1,11 +1,18 @@
+import json
+from datetime import timedelta
 from io import StringIO
+from tempfile import NamedTemporaryFile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.management import call_command
-from django.test import TestCase
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.utils import translation
+from django.utils import timezone, translation
 
 from wagtail.actions.copy_for_translation import CopyPageForTranslationAction
 from wagtail.images import get_image_model
@@ -20,14 +27,17 @@ from folioblog.blog.factories import (
     BlogIndexPageFactory,
     BlogPageFactory,
 )
+from folioblog.blog.models import BlogPage
 from folioblog.core.factories import (
     BasicPageFactory,
     FolioBlogSettingsFactory,
     ImageFactory,
     LocaleFactory,
 )
-from folioblog.core.models import FolioBlogSettings
-from folioblog.core.utils.tests.units import SiteRootPageSwitchTestCase
+from folioblog.core.management.commands.loadcachepages import AJAX_HEADERS, RateLimiter
+from folioblog.core.models import FolioBlogSettings, WarmupURL
+from folioblog.core.pagination import keyset_token
+from folioblog.core.utils.tests.units import SiteRootPageSwitchTestCase, SyncExecutor
 from folioblog.gallery.factories import GalleryPageFactory
 from folioblog.home.factories import HomePageFactory
 from folioblog.portfolio.factories import PortfolioPageFactory
@@ -243,20 +253,20 @@ class LoadCachePagesMultiDomainCommandTestCase(TestCase):
         call_command("loadcachepages", stdout=out)
 
         self.assertIn(
-            f"{self.blog_index.full_url}?ajax=1&page=1&category={self.post.category.slug}",
+            f"{self.blog_index.full_url}?ajax=1&category={self.post.category.slug}",
             out.getvalue(),
         )
         self.assertNotIn(
-            f"{self.blog_index.full_url}?ajax=1&page=1&category={self.other_post.category.slug}",
+            f"{self.blog_index.full_url}?ajax=1&category={self.other_post.category.slug}",
             out.getvalue(),
         )
 
         self.assertIn(
-            f"{self.other_blog_index.full_url}?ajax=1&page=1&category={self.other_post.category.slug}",
+            f"{self.other_blog_index.full_url}?ajax=1&category={self.other_post.category.slug}",
             out.getvalue(),
         )
         self.assertNotIn(
-            f"{self.other_blog_index.full_url}?ajax=1&page=1&category={self.post.category.slug}",
+            f"{self.other_blog_index.full_url}?ajax=1&category={self.post.category.slug}",
             out.getvalue(),
         )
 
@@ -265,20 +275,20 @@ class LoadCachePagesMultiDomainCommandTestCase(TestCase):
         call_command("loadcachepages", stdout=out)
 
         self.assertIn(
-            f"{self.video_index.full_url}?ajax=1&page=1&category={self.video.category.slug}",
+            f"{self.video_index.full_url}?ajax=1&category={self.video.category.slug}",
             out.getvalue(),
         )
         self.assertNotIn(
-            f"{self.video_index.full_url}?ajax=1&page=1&category={self.other_video.category.slug}",
+            f"{self.video_index.full_url}?ajax=1&category={self.other_video.category.slug}",
             out.getvalue(),
         )
 
         self.assertIn(
-            f"{self.other_video_index.full_url}?ajax=1&page=1&category={self.other_video.category.slug}",
+            f"{self.other_video_index.full_url}?ajax=1&category={self.other_video.category.slug}",
             out.getvalue(),
         )
         self.assertNotIn(
-            f"{self.other_video_index.full_url}?ajax=1&page=1&category={self.video.category.slug}",
+            f"{self.other_video_index.full_url}?ajax=1&category={self.video.category.slug}",
             out.getvalue(),
         )
 
@@ -324,15 +334,23 @@ class LoadCachePagesCollectionRootNoneCommandTestCase(TestCase):
     def tearDown(self):
         self.mock_request.stop()
 
+    @override_settings(FOLIOBLOG_GALLERY_SHUFFLE_SECONDS=0)
     def test_collection_without_settings(self):
         out = StringIO()
         call_command("loadcachepages", stdout=out)
 
         self.assertIn(
-            f'Requesting: GET "{self.gallery.full_url}?ajax=1&collection={self.collection.pk}"',
+            f'Requesting: GET "{self.gallery.full_url}?ajax=1&page=1&collection={self.collection.pk}&seed=0"',
             out.getvalue(),
         )
 
+    def test_seed(self):
+        out = StringIO()
+        with mock.patch("folioblog.core.utils.time.time", return_value=settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS):
+            call_command("loadcachepages", stdout=out)
+
+        self.assertIn(f'Requesting: GET "{self.gallery.full_url}?ajax=1&page=1&seed=1"', out.getvalue())
+
 
 class LoadCachePagesPrivateCommandTestCase(TestCase):
     @classmethod
@@ -385,3 +403,325 @@ class LoadCachePagesPrivateCommandTestCase(TestCase):
             f'Requesting: GET "{self.post.full_url}"',
             out.getvalue(),
         )
+
+
+class LoadCachePagesConcurrencyCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.home = HomePageFactory(parent=cls.site.root_page)
+        FolioBlogSettingsFactory(site=cls.site)
+        cls.index = BlogIndexPageFactory(parent=cls.home)
+        cls.posts = BlogPageFactory.create_batch(5, parent=cls.index)
+
+        cls.pages = [cls.home.get_parent(), cls.home, cls.index] + cls.posts
+
+    def setUp(self):
+        self.mock_request = requests_mock.Mocker()
+        self.mock_request.start()
+        self.mock_request.get(requests_mock.ANY, text="Ok")
+        self.mock_request.get(f"{self.site.root_url}/givemea404please", status_code=404)
+
+    def tearDown(self):
+        self.mock_request.stop()
+
+    def test_concurrency(self):
+        out = StringIO()
+        call_command("loadcachepages", concurrency=4, stdout=out)
+
+        for page in self.pages:
+            self.assertIn(f'Requesting: GET "{page.full_url}"', out.getvalue())
+        self.assertIn("All page cache loaded", out.getvalue())
+
+    def test_summary(self):
+        out = StringIO()
+        call_command("loadcachepages", stdout=out)
+
+        self.assertIn(f"page: {len(self.pages)} requests, 0 errors", out.getvalue())
+        self.assertIn("404: 1 requests, 0 errors", out.getvalue())
+        self.assertIn(f"view: {len(settings.LANGUAGES) * 2} requests, 0 errors", out.getvalue())
+
+    def test_summary_errors(self):
+        self.mock_request.get(self.index.full_url, status_code=400)
+
+        out = StringIO()
+        call_command("loadcachepages", stdout=out)
+        self.assertIn(f"page: {len(self.pages)} requests, 1 errors", out.getvalue())
+
+    def test_retries(self):
+        self.mock_request.get(
+            self.index.full_url,
+            [
+                {"exc": requests.exceptions.ConnectionError},
+                {"status_code": 503},
+                {"text": "Ok"},
+            ],
+        )
+
+        out = StringIO()
+        with mock.patch("time.sleep") as mock_sleep:
+            call_command("loadcachepages", retries=2, backoff=1, stdout=out)
+
+        self.assertNotIn(f"Error for page {self.index.full_url}", out.getvalue())
+        self.assertNotIn(f"Error on page {self.index.full_url}", out.getvalue())
+        self.assertListEqual([c.args[0] for c in mock_sleep.call_args_list], [1, 2])
+
+    def test_retries_exhausted(self):
+        self.mock_request.get(self.index.full_url, status_code=503)
+
+        out = StringIO()
+        with mock.patch("time.sleep"):
+            call_command("loadcachepages", retries=1, stdout=out)
+        self.assertIn(f"Error for page {self.index.full_url} with status 503", out.getvalue())
+
+    def test_rate(self):
+        with mock.patch("time.sleep") as mock_sleep:
+            call_command("loadcachepages", rate=1, stdout=StringIO())
+        self.assertTrue(mock_sleep.called)
+
+
+class RateLimiterTestCase(SimpleTestCase):
+    def test_no_limit(self):
+        with mock.patch("time.sleep") as mock_sleep:
+            limiter = RateLimiter(0)
+            limiter.wait()
+            limiter.wait()
+        mock_sleep.assert_not_called()
+
+    def test_limit(self):
+        with mock.patch("time.monotonic", return_value=10):
+            with mock.patch("time.sleep") as mock_sleep:
+                limiter = RateLimiter(2)
+                limiter.wait()
+                limiter.wait()
+                limiter.wait()
+        self.assertListEqual([c.args[0] for c in mock_sleep.call_args_list], [0.5, 1])
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class LoadCachePagesInProcessCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.home = HomePageFactory(parent=cls.site.root_page)
+        FolioBlogSettingsFactory(site=cls.site)
+        cls.index = BlogIndexPageFactory(parent=cls.home)
+        cls.post = BlogPageFactory(parent=cls.index)
+
+        cls.pages = [cls.home.get_parent(), cls.home, cls.index, cls.post]
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_in_process(self):
+        out = StringIO()
+        with requests_mock.Mocker() as m:
+            call_command("loadcachepages", in_process=True, stdout=out)
+        self.assertFalse(m.called)
+
+        for page in self.pages:
+            self.assertIn(f'Rendering: GET "{page.full_url}"', out.getvalue())
+        self.assertIn(f"page: {len(self.pages)} requests, 0 errors", out.getvalue())
+        self.assertIn("404: 1 requests, 0 errors", out.getvalue())
+
+        # Pages are now in cache.
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.post.url, HTTP_HOST=self.site.hostname)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(cm.captured_queries), 0)
+
+    def test_in_process_error(self):
+        out = StringIO()
+        with mock.patch(
+            "folioblog.core.management.commands.loadcachepages.render_page",
+            return_value=(500, 0.1),
+        ):
+            call_command("loadcachepages", in_process=True, stdout=out)
+        self.assertIn(f"Error for page {self.post.full_url} with status 500", out.getvalue())
+
+    @modify_settings(MIDDLEWARE={"remove": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"]})
+    def test_in_process_cache_disabled(self):
+        out = StringIO()
+        call_command("loadcachepages", in_process=True, stdout=out)
+        self.assertIn("Page cache is disabled", out.getvalue())
+
+    @mock.patch("folioblog.core.management.commands.loadcachepages.connections.close_all")
+    @mock.patch("folioblog.core.management.commands.loadcachepages.ProcessPoolExecutor", SyncExecutor)
+    def test_in_process_pool(self, mock_close_all):
+        out = StringIO()
+        call_command("loadcachepages", in_process=True, concurrency=4, stdout=out)
+
+        mock_close_all.assert_called_once()
+        for page in self.pages:
+            self.assertIn(f'Rendering: GET "{page.full_url}"', out.getvalue())
+
+
+class LoadCachePagesIncrementalCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.home = HomePageFactory(parent=cls.site.root_page)
+        FolioBlogSettingsFactory(site=cls.site)
+        cls.index = BlogIndexPageFactory(parent=cls.home)
+        cls.post = BlogPageFactory(parent=cls.index)
+
+    def setUp(self):
+        self.mock_request = requests_mock.Mocker()
+        self.mock_request.start()
+        self.mock_request.get(requests_mock.ANY, text="Ok")
+
+    def tearDown(self):
+        self.mock_request.stop()
+
+    def test_incremental(self):
+        WarmupURL.objects.create(site=self.site, url=self.post.full_url)
+        WarmupURL.objects.create(site=self.site, url=f"{self.index.full_url}?ajax=1&page=1", ajax=True)
+
+        out = StringIO()
+        call_command("loadcachepages", incremental=True, stdout=out)
+
+        self.assertNotIn("clearing cache", out.getvalue())
+        self.assertNotIn(f'Requesting: GET "{self.home.full_url}"', out.getvalue())
+        self.assertIn(f'Requesting: GET "{self.post.full_url}"', out.getvalue())
+        self.assertIn("2 evicted pages loaded.", out.getvalue())
+        self.assertIn("queue: 2 requests, 0 errors", out.getvalue())
+        self.assertFalse(WarmupURL.objects.exists())
+
+        history = {r.url: r for r in self.mock_request.request_history}
+        self.assertNotIn("X-Requested-With", history[self.post.full_url].headers)
+        self.assertEqual(history[f"{self.index.full_url}?ajax=1&page=1"].headers["X-Requested-With"], "XMLHttpRequest")
+
+    def test_incremental_evicted_meanwhile(self):
+        WarmupURL.objects.create(site=self.site, url=self.post.full_url, created_at=timezone.now() + timedelta(days=1))
+
+        out = StringIO()
+        call_command("loadcachepages", incremental=True, stdout=out)
+        self.assertIn("0 evicted pages loaded.", out.getvalue())
+        self.assertTrue(WarmupURL.objects.exists())
+
+    @override_settings(ALLOWED_HOSTS=["*"])
+    def test_incremental_in_process(self):
+        WarmupURL.objects.create(site=self.site, url=self.post.full_url)
+
+        out = StringIO()
+        call_command("loadcachepages", incremental=True, in_process=True, stdout=out)
+        self.assertIn(f'Rendering: GET "{self.post.full_url}"', out.getvalue())
+        self.assertIn("queue: 1 requests, 0 errors", out.getvalue())
+
+
+class LoadCachePagesPlanCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.home = HomePageFactory(parent=cls.site.root_page)
+        FolioBlogSettingsFactory(site=cls.site, blog_pager_limit=2)
+        cls.index = BlogIndexPageFactory(parent=cls.home)
+        cls.posts = BlogPageFactory.create_batch(3, parent=cls.index, category__slug="foo")
+        cls.video_index = VideoIndexPageFactory(parent=cls.home)
+        cls.video = VideoPageFactory(parent=cls.video_index, category__slug="bar")
+
+    def setUp(self):
+        self.mock_request = requests_mock.Mocker()
+        self.mock_request.start()
+        self.mock_request.get(requests_mock.ANY, text="Ok")
+
+    def tearDown(self):
+        self.mock_request.stop()
+
+    def get_after(self, limit):
+        # Token of the last post of the first chunk.
+        return keyset_token(BlogPage.objects.child_of(self.index).order_by("-date", "-pk")[limit - 1])
+
+    def get_plan(self, **kwargs):
+        out = StringIO()
+        call_command("loadcachepages", dry_run=True, stdout=out, **kwargs)
+        return json.loads(out.getvalue())
+
+    def test_dry_run(self):
+        with mock.patch("folioblog.core.management.commands.loadcachepages.invalidate_site") as m:
+            plan = self.get_plan()
+
+        m.assert_not_called()
+        self.assertFalse(self.mock_request.called)
+
+        urls = {item["url"]: item for item in plan}
+        self.assertEqual(urls[self.home.full_url]["kind"], "page")
+        self.assertEqual(urls[self.home.full_url]["site"], self.site.hostname)
+        self.assertFalse(urls[self.home.full_url]["ajax"])
+        after = self.get_after(2)
+        self.assertIn(f"{self.index.full_url}?ajax=1", urls)
+        self.assertIn(f"{self.index.full_url}?ajax=1&after={after}", urls)
+        self.assertEqual(len([url for url in urls if url.startswith(f"{self.index.full_url}?")]), 4)
+        self.assertTrue(urls[f"{self.index.full_url}?ajax=1&after={after}&category=foo"]["ajax"])
+        self.assertIn(f"{self.video_index.full_url}?ajax=1&category=bar", urls)
+        self.assertEqual(urls[f"{self.site.root_url}/givemea404please"]["status"], 404)
+
+    def test_priorities(self):
+        plan = self.get_plan()
+        kinds = [item["kind"] for item in plan]
+        self.assertListEqual(kinds[: kinds.count("page")], ["page"] * kinds.count("page"))
+        self.assertLess(kinds.index("pagination"), kinds.index("category"))
+        # Shallow pages first.
+        self.assertEqual(plan[0]["url"], self.home.get_parent().full_url)
+
+    @override_settings(FOLIOBLOG_CACHE_WARMUP_PRIORITIES={"category": 100})
+    def test_priorities_settings(self):
+        plan = self.get_plan()
+        self.assertEqual(plan[0]["kind"], "category")
+
+    def test_access_log(self):
+        after = self.get_after(2)
+        lines = [
+            f'127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET {self.video.url} HTTP/1.1" 200 512 "-" "Mozilla"',
+            f'127.0.0.1 - - [18/Oct/2026:10:00:01 +0000] "GET {self.video.url} HTTP/1.1" 200 512 "-" "Mozilla"',
+            f'127.0.0.1 - - [18/Oct/2026:10:00:02 +0000] "GET {self.index.url}?category=foo&after={after}&ajax=1 '
+            'HTTP/1.1"',
+            "garbage",
+        ]
+        with NamedTemporaryFile("w", suffix=".log") as f:
+            f.write("\n".join(lines))
+            f.flush()
+            plan = self.get_plan(log=f.name)
+
+        self.assertEqual(plan[0]["url"], self.video.full_url)
+        self.assertEqual(plan[0]["hits"], 2)
+        self.assertEqual(plan[1]["url"], f"{self.index.full_url}?ajax=1&after={after}&category=foo")
+        self.assertEqual(plan[1]["hits"], 1)
+        self.assertEqual(plan[2]["hits"], 0)
+
+    def test_keyset_walk(self):
+        BlogPageFactory.create_batch(2, parent=self.index, category__slug="bar")
+        urls = [item["url"] for item in self.get_plan() if item["kind"] == "pagination"]
+        urls = [url for url in urls if url.startswith(f"{self.index.full_url}?")]
+        self.assertEqual(len(urls), 3)
+
+        # Same tokens as the ones rendered for the infinite scroll.
+        for url, next_url in zip(urls, urls[1:] + [None]):
+            response = self.client.get(url.replace(self.index.full_url, self.index.url), headers=AJAX_HEADERS)
+            after = response.context["next_after"]
+            self.assertEqual(f"{self.index.full_url}?ajax=1&after={after}" if after else None, next_url)
+
+    def test_queries_per_category(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as cm:
+            self.get_plan()
+        num_queries = len(cm.captured_queries)
+
+        for i in range(3):
+            BlogPageFactory(parent=self.index, category__slug=f"blog{i}")
+            VideoPageFactory(parent=self.video_index, category__slug=f"video{i}")
+        cache.clear()
+        with CaptureQueriesContext(connection) as cm:
+            plan = self.get_plan()
+
+        self.assertEqual(len([item for item in plan if item["kind"] == "category"]), 9)
+        self.assertEqual(len(cm.captured_queries), num_queries)
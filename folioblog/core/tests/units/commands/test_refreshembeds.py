@@ -0,0 +1,109 @@
+import socket
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from wagtail.embeds.embeds import get_embed
+from wagtail.embeds.exceptions import EmbedNotFoundException
+from wagtail.embeds.models import Embed
+
+from folioblog.video.factories import EmbedFactory
+from folioblog.video.finders import StubEmbedFinder
+
+STUB_FINDERS = [{"class": "folioblog.video.finders", "cache_age": 3600}]
+
+
+@override_settings(WAGTAILEMBEDS_FINDERS=STUB_FINDERS, FOLIOBLOG_EMBED_REFRESH_SECONDS=600)
+class RefreshEmbedsCommandTestCase(TestCase):
+    def create_embed(self, video_id, expires_in):
+        cache_until = timezone.now() + timedelta(seconds=expires_in) if expires_in is not None else None
+        return EmbedFactory(
+            url=f"https://www.youtube.com/watch?v={video_id}",
+            title="old",
+            max_width=None,
+            cache_until=cache_until,
+        )
+
+    def test_refresh(self):
+        expiring = self.create_embed("foo", 60)
+        expired = self.create_embed("bar", -60)
+        later = self.create_embed("baz", 3600)
+        never = self.create_embed("qux", None)
+
+        out = StringIO()
+        call_command("refreshembeds", stdout=out)
+        self.assertIn("2 embeds refreshed, 0 failed.", out.getvalue())
+
+        for embed in [expiring, expired]:
+            embed.refresh_from_db()
+            self.assertEqual(embed.title, f"Video {embed.url.split('=')[-1]}")
+            self.assertGreater(embed.cache_until, timezone.now() + timedelta(seconds=3500))
+            self.assertEqual(embed.width, 480)
+
+        for embed in [later, never]:
+            embed.refresh_from_db()
+            self.assertEqual(embed.title, "old")
+
+    def test_refresh_within(self):
+        embed = self.create_embed("foo", 3000)
+        call_command("refreshembeds", "--within", 3600, stdout=StringIO())
+        embed.refresh_from_db()
+        self.assertEqual(embed.title, "Video foo")
+
+    def test_refresh_served(self):
+        embed = self.create_embed("foo", 60)
+        call_command("refreshembeds", stdout=StringIO())
+        self.assertEqual(get_embed(embed.url).title, "Video foo")
+        self.assertEqual(Embed.objects.count(), 1)
+
+    @override_settings(WAGTAILEMBEDS_FINDERS=[{"class": "folioblog.video.finders"}])
+    def test_refresh_no_more_expiry(self):
+        embed = self.create_embed("foo", 60)
+        call_command("refreshembeds", stdout=StringIO())
+        embed.refresh_from_db()
+        self.assertIsNone(embed.cache_until)
+
+    def test_failures(self):
+        embed = self.create_embed("", 60)
+        ok = self.create_embed("foo", 60)
+
+        out = StringIO()
+        call_command("refreshembeds", stdout=out)
+
+        self.assertIn(f"Error on embed {embed.url} with exc EmbedNotFoundException()", out.getvalue())
+        self.assertIn("1 embeds refreshed, 1 failed.", out.getvalue())
+        embed.refresh_from_db()
+        self.assertEqual(embed.title, "old")
+        ok.refresh_from_db()
+        self.assertEqual(ok.title, "Video foo")
+
+    @override_settings(WAGTAILEMBEDS_FINDERS=[{"class": "wagtail.embeds.finders.base.EmbedFinder"}])
+    def test_unsupported_provider(self):
+        self.create_embed("foo", 60)
+        out = StringIO()
+        call_command("refreshembeds", stdout=out)
+        self.assertIn("EmbedUnsupportedProviderException", out.getvalue())
+
+    def test_timeout(self):
+        self.create_embed("foo", 60)
+        timeouts = []
+
+        def find_embed(self, *args, **kwargs):
+            timeouts.append(socket.getdefaulttimeout())
+            raise EmbedNotFoundException
+
+        default_timeout = socket.getdefaulttimeout()
+        with mock.patch.object(StubEmbedFinder, "find_embed", find_embed):
+            call_command("refreshembeds", "--timeout", 3, "--concurrency", 1, stdout=StringIO())
+
+        self.assertListEqual(timeouts, [3])
+        self.assertEqual(socket.getdefaulttimeout(), default_timeout)
+
+    def test_concurrency_invalid(self):
+        self.create_embed("foo", 60)
+        with self.assertRaisesMessage(CommandError, "Concurrency must be at least 1."):
+            call_command("refreshembeds", "--concurrency", 0, stdout=StringIO())
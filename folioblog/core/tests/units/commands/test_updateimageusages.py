@@ -0,0 +1,53 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from folioblog.blog.factories import BlogIndexPageFactory, BlogPageFactory
+from folioblog.core.factories import BasicPageFactory, ImageFactory
+from folioblog.core.models import ImageUsage
+from folioblog.video.factories import VideoIndexPageFactory, VideoPageFactory
+
+
+class UpdateImageUsagesCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.image = ImageFactory()
+        cls.image_body = ImageFactory()
+
+        cls.basic = BasicPageFactory(image=cls.image, image_alt="basic", body="")
+        cls.post = BlogPageFactory(
+            parent=BlogIndexPageFactory(),
+            image=cls.image,
+            image_alt="post",
+            image_body=None,
+            body=f'<embed alt="body" embedtype="image" id="{cls.image_body.pk}"/>',
+        )
+        cls.video = VideoPageFactory(parent=VideoIndexPageFactory(), image=cls.image, image_alt="video", body="")
+        cls.draft = BasicPageFactory(image=cls.image_body, body="", live=False)
+
+    def test_rebuild(self):
+        ImageUsage.objects.all().delete()
+        ImageUsage.objects.create(image=self.image_body, page=self.draft, locale=self.draft.locale)
+
+        out = StringIO()
+        call_command("updateimageusages", stdout=out)
+
+        usages = ImageUsage.objects.values_list("image_id", "page_id", "caption")
+        self.assertCountEqual(
+            usages,
+            [
+                (self.image.pk, self.basic.pk, "basic"),
+                (self.image.pk, self.post.pk, "post"),
+                (self.image_body.pk, self.post.pk, "body"),
+                (self.image.pk, self.video.pk, "video"),
+                (self.video.thumbnail_id, self.video.pk, ""),
+            ],
+        )
+        self.assertIn("5 image usages built.", out.getvalue())
+
+    def test_same_as_signals(self):
+        usages = list(ImageUsage.objects.values_list("image_id", "page_id", "locale_id", "caption"))
+
+        call_command("updateimageusages", stdout=StringIO())
+        self.assertCountEqual(ImageUsage.objects.values_list("image_id", "page_id", "locale_id", "caption"), usages)
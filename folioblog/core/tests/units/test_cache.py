@@ -1,16 +1,50 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
 from django.db import connection
-from django.test import TestCase, modify_settings
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, modify_settings, override_settings
 from django.test.utils import CaptureQueriesContext
 
+from wagtail.models import Page, Site
+
+import requests_mock
+from wagtail_factories import SiteFactory
+
 from folioblog.blog.factories import (
     BlogCategoryFactory,
     BlogIndexPageFactory,
     BlogPageFactory,
     BlogTagFactory,
 )
-from folioblog.core.apps import connect_cache_signal
-from folioblog.core.factories import ImageFactory
+from folioblog.blog.models import BlogIndexPage
+from folioblog.core.apps import connect_cache_signal, disconnect_cache_signal
+from folioblog.core.cache import (
+    LocalPageCache,
+    acquire_lock,
+    generation_key,
+    get_cache,
+    get_cache_url,
+    get_dependency_slots,
+    get_dependent_pages,
+    get_instance_site_ids,
+    invalidate_instance,
+    invalidate_site,
+    local_cache,
+    lock_key,
+    normalize_flag,
+    query_params_key,
+    record_dependencies,
+    sites_key,
+)
+from folioblog.core.factories import FolioBlogSettingsFactory, ImageFactory
+from folioblog.core.models import FolioBlogSettings, WarmupURL
+from folioblog.home.factories import HomePageFactory
+from folioblog.user.factories import UserFactory
 
 
 @modify_settings(
@@ -22,6 +56,9 @@ from folioblog.core.factories import ImageFactory
 class ResetCacheTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        FolioBlogSettingsFactory(site=cls.site)
+
         cls.index = BlogIndexPageFactory()
         cls.category = BlogCategoryFactory()
         cls.tag = BlogTagFactory()
@@ -34,11 +71,21 @@ class ResetCacheTestCase(TestCase):
             tags=[cls.tag],
         )
 
+        cls.other_home = HomePageFactory(parent=None)
+        cls.other_site = SiteFactory(root_page=cls.other_home)
+        cls.other_index = BlogIndexPageFactory(parent=cls.other_home)
+        cls.other_page = BlogPageFactory(parent=cls.other_index)
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
         connect_cache_signal()
 
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
     def tearDown(self):
         cache.clear()
 
@@ -152,3 +199,756 @@ class ResetCacheTestCase(TestCase):
         count = len([q["sql"] for q in cm.captured_queries])
         self.assertEqual(response.status_code, 200)
         self.assertGreater(count, 0)
+
+    def test_cache_clear_settings(self):
+        # No cache yet
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+        FolioBlogSettings.for_site(self.site).save()
+
+        # No cache (rebuild)
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+    def test_cache_clear_new_page(self):
+        # No cache yet
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.index.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+        BlogPageFactory(parent=self.index, category=self.category)
+
+        # No cache (rebuild)
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.index.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+    def test_cache_keep_unrelated_image(self):
+        image = ImageFactory()
+
+        # No cache yet
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+        image.save()
+
+        # Still a cache hit
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count, 0)
+
+    def test_cache_keep_other_site(self):
+        # No cache yet
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.index.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+        self.other_index.save()
+        self.other_page.save()
+
+        # Still a cache hit
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.index.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count, 0)
+
+    def assertDependentPages(self, site, label, pk=None, count=1):
+        self.assertEqual(len(get_dependent_pages([site.pk], [(label, pk)])), count)
+
+    def assertCacheHit(self, url, hit=True):
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if hit:
+            self.assertEqual(len(cm.captured_queries), 0)
+        else:
+            self.assertGreater(len(cm.captured_queries), 0)
+
+    def test_cache_keep_sibling_page(self):
+        sibling = BlogPageFactory(parent=self.index, category=self.category)
+        self.assertCacheHit(sibling.url, hit=False)
+        self.assertCacheHit(sibling.url)
+
+        self.page.save()
+        self.assertCacheHit(sibling.url)
+
+    def test_cache_keep_draft(self):
+        self.assertCacheHit(self.index.url, hit=False)
+        self.assertCacheHit(self.page.url, hit=False)
+
+        self.page.title = "Draft"
+        self.page.save_revision()
+        self.assertCacheHit(self.index.url)
+        self.assertCacheHit(self.page.url)
+
+    def test_cache_keep_new_image(self):
+        self.assertCacheHit(self.page.url, hit=False)
+        ImageFactory()
+        self.assertCacheHit(self.page.url)
+
+    def test_cache_dependencies(self):
+        self.client.get(self.page.url)
+
+        self.assertDependentPages(self.site, "wagtailcore.page", self.page.pk)
+        self.assertDependentPages(self.site, "blog.blogpage", count=0)
+        self.assertDependentPages(self.site, "core.folioimage", self.image.pk)
+        self.assertDependentPages(self.site, "blog.blogcategory", self.category.pk)
+        self.assertDependentPages(self.other_site, "wagtailcore.page", self.page.pk, count=0)
+
+        self.page.save()
+        self.assertDependentPages(self.site, "wagtailcore.page", self.page.pk, count=0)
+
+    def test_cache_dependencies_listing(self):
+        self.client.get(self.index.url)
+        self.assertDependentPages(self.site, "blog.blogpage")
+
+    def test_cache_dependencies_shared(self):
+        # Each page gets its own slot, none of them is overwritten.
+        self.client.get(self.page.url)
+        self.client.get(self.index.url)
+        self.assertDependentPages(self.site, "wagtailcore.page", self.page.pk, count=2)
+
+        record_dependencies(self.site.pk, {"foo": ("http://foo", False)}, [("blog.blogpage", None)], 60)
+        self.assertDependentPages(self.site, "blog.blogpage", count=2)
+
+        pages = invalidate_instance(self.page)
+        self.assertEqual(len(pages), 3)
+        self.assertDependentPages(self.site, "blog.blogpage", count=0)
+
+    def test_cache_dependencies_one_slot(self):
+        dependencies = [("blog.blogpage", None), ("wagtailcore.page", self.page.pk)]
+        record_dependencies(self.site.pk, {"foo": ("http://foo", False)}, dependencies, 60)
+        with mock.patch.object(LocMemCache, "incr", wraps=get_cache().incr) as mock_incr:
+            record_dependencies(self.site.pk, {"bar": ("http://bar", False)}, dependencies, 60)
+        self.assertEqual(mock_incr.call_count, 1)
+
+        self.assertDependentPages(self.site, "blog.blogpage", count=2)
+        self.assertDependentPages(self.site, "wagtailcore.page", self.page.pk, count=2)
+
+    def test_cache_dependencies_floor(self):
+        record_dependencies(self.site.pk, {"foo": ("http://foo", False)}, [("blog.blogpage", None)], 60)
+        invalidate_instance(self.page)
+
+        # Evicted slots are not looked up anymore.
+        slots, floors = get_dependency_slots([self.site.pk], [("blog.blogpage", None)])
+        self.assertDictEqual(slots, {})
+        self.assertDictEqual(floors, {})
+
+    def test_cache_dependencies_authenticated(self):
+        self.client.force_login(UserFactory(is_staff=True))
+        self.client.get(self.page.url)
+
+        self.assertDependentPages(self.site, "wagtailcore.page", self.page.pk, count=0)
+
+    def test_cache_page_without_site(self):
+        # Translated pages, for e.g, so all sites are checked.
+        with mock.patch.object(Page, "get_site", return_value=None):
+            site_ids = get_instance_site_ids(self.page)
+        self.assertListEqual(sorted(site_ids), sorted([self.site.pk, self.other_site.pk]))
+
+
+@override_settings(ALLOWED_HOSTS=["*"])
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class SiteGenerationCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.page = BlogIndexPageFactory()
+
+        cls.other_home = HomePageFactory(parent=None)
+        cls.other_site = SiteFactory(root_page=cls.other_home, hostname="other.folio.local")
+        cls.other_page = BlogIndexPageFactory(parent=cls.other_home)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connect_cache_signal()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertCacheHit(self, url, hit=True, **kwargs):
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(url, **kwargs)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        if hit:
+            self.assertEqual(count, 0)
+        else:
+            self.assertGreater(count, 0)
+
+    def test_site_invalidation(self):
+        other_url = self.other_page.relative_url(self.other_site)
+        for hit in [False, True]:
+            self.assertCacheHit(self.page.url, hit=hit)
+            self.assertCacheHit(other_url, hit=hit, HTTP_HOST=self.other_site.hostname)
+
+        invalidate_site(self.site.pk)
+
+        self.assertCacheHit(self.page.url, hit=False)
+        self.assertCacheHit(other_url, hit=True, HTTP_HOST=self.other_site.hostname)
+
+    def test_site_invalidation_not_initialized(self):
+        invalidate_site(self.site.pk)
+        self.assertIsNotNone(get_cache().get(generation_key(self.site.pk)))
+
+    def test_locale_invalidation(self):
+        self.assertCacheHit(self.page.url, hit=False)
+        self.assertCacheHit(self.page.url, hit=True)
+
+        invalidate_site(self.site.pk, "en")
+        self.assertCacheHit(self.page.url, hit=True)
+
+        invalidate_site(self.site.pk, "fr")
+        self.assertCacheHit(self.page.url, hit=False)
+
+    def test_site_save(self):
+        self.assertCacheHit(self.page.url, hit=False)
+        self.assertCacheHit(self.page.url, hit=True)
+
+        self.site.save()
+
+        self.assertIsNone(get_cache().get(sites_key()))
+        self.assertCacheHit(self.page.url, hit=False)
+
+    def test_cache_clear_keep_other_entries(self):
+        get_cache().set("foo", "bar")
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, text="Ok")
+            call_command("loadcachepages", stdout=StringIO())
+        self.assertEqual(get_cache().get("foo"), "bar")
+
+
+@override_settings(FOLIOBLOG_CACHE_STALE_SECONDS=60)
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class StaleCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.page = BlogIndexPageFactory(title="Foo")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connect_cache_signal()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, locked=False):
+        with mock.patch("folioblog.core.middleware.acquire_lock", return_value=not locked) as mock_lock:
+            with CaptureQueriesContext(connection) as cm:
+                response = self.client.get(self.page.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(cm.captured_queries), mock_lock
+
+    def test_stale_while_revalidate(self):
+        self.get()
+        self.page.title = "Bar"
+        self.page.save()
+
+        # Another worker is regenerating it, serve the stale one meanwhile.
+        response, count, mock_lock = self.get(locked=True)
+        self.assertEqual(count, 0)
+        self.assertTrue(mock_lock.called)
+        self.assertContains(response, "Foo")
+
+        # Well, that's our turn!
+        response, count, mock_lock = self.get()
+        self.assertGreater(count, 0)
+        self.assertContains(response, "Bar")
+
+        # Fresh again
+        response, count, mock_lock = self.get(locked=True)
+        self.assertEqual(count, 0)
+        self.assertFalse(mock_lock.called)
+        self.assertContains(response, "Bar")
+
+    def test_stale_site_invalidation(self):
+        self.get()
+        invalidate_site(self.site.pk)
+
+        response, count, mock_lock = self.get(locked=True)
+        self.assertEqual(count, 0)
+
+    def test_stale_lock_released(self):
+        self.get()
+        self.page.save()
+
+        response = self.client.get(self.page.url)
+        marker_key, entry_key = response.wsgi_request._cache_keys
+        self.assertTrue(acquire_lock(marker_key, 10))
+        self.assertFalse(acquire_lock(marker_key, 10))
+
+    @override_settings(FOLIOBLOG_CACHE_STALE_SECONDS=0)
+    def test_stale_disabled(self):
+        self.get()
+        self.page.save()
+
+        response, count, mock_lock = self.get()
+        self.assertGreater(count, 0)
+
+
+@override_settings(FOLIOBLOG_CACHE_LOCK_WAIT_SECONDS=1)
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class DogpileCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.page = BlogIndexPageFactory()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, url, sleep=None):
+        with mock.patch("folioblog.core.middleware.acquire_lock", return_value=False):
+            with mock.patch("time.sleep", side_effect=sleep) as mock_sleep:
+                with CaptureQueriesContext(connection) as cm:
+                    response = self.client.get(url)
+        return response, len(cm.captured_queries), mock_sleep
+
+    def test_wait_for_other_worker(self):
+        response = self.client.get(self.page.url)
+        keys = response.wsgi_request._cache_keys
+        values = cache.get_many(keys)
+        cache.delete_many(keys)
+        # Pretend another worker is building it.
+        acquire_lock(keys[0], 10)
+
+        response, count, mock_sleep = self.get(self.page.url, sleep=lambda s: cache.set_many(values))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count, 0)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    def test_wait_lock_released(self):
+        response, count, mock_sleep = self.get(self.page.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    @override_settings(FOLIOBLOG_CACHE_LOCK_WAIT_SECONDS=0)
+    def test_wait_timeout(self):
+        response = self.client.get(self.page.url)
+        keys = response.wsgi_request._cache_keys
+        cache.delete_many(keys)
+        acquire_lock(keys[0], 10)
+
+        response, count, mock_sleep = self.get(self.page.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+    def test_lock_released(self):
+        response = self.client.get(self.page.url)
+        marker_key, entry_key = response.wsgi_request._cache_keys
+        self.assertIsNone(cache.get(lock_key(marker_key)))
+
+    def test_lock_released_not_cacheable(self):
+        response = self.client.get("/foo/")
+        self.assertEqual(response.status_code, 404)
+        marker_key, entry_key = response.wsgi_request._cache_keys
+        self.assertIsNone(cache.get(marker_key))
+        self.assertIsNone(cache.get(lock_key(marker_key)))
+
+
+@override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=10)
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class LocalCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.page = BlogIndexPageFactory()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connect_cache_signal()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+        local_cache.clear()
+
+    def assertCacheHit(self, hit=True):
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+        self.assertEqual(response.status_code, 200)
+        if hit:
+            self.assertEqual(len(cm.captured_queries), 0)
+        else:
+            self.assertGreater(len(cm.captured_queries), 0)
+        return response
+
+    def test_local_hit(self):
+        response = self.assertCacheHit(hit=False)
+        content = response.content
+        marker_key, entry_key = response.wsgi_request._cache_keys
+        self.assertEqual(len(local_cache), 0)
+
+        self.assertCacheHit()
+        self.assertEqual(len(local_cache), 1)
+
+        # Served from the local copy only.
+        cache.delete(entry_key)
+        response = self.assertCacheHit()
+        self.assertEqual(response.content, content)
+
+    def test_local_hit_copy(self):
+        self.client.get(self.page.url)
+        self.client.get(self.page.url)
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        response = self.client.get(self.page.url)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_local_invalidation(self):
+        self.assertCacheHit(hit=False)
+        self.assertCacheHit()
+
+        self.page.save()
+        self.assertCacheHit(hit=False)
+
+    def test_local_site_invalidation(self):
+        self.assertCacheHit(hit=False)
+        self.assertCacheHit()
+
+        invalidate_site(self.site.pk)
+        self.assertCacheHit(hit=False)
+
+    def test_local_no_round_trip(self):
+        self.assertCacheHit(hit=False)
+        self.assertCacheHit()
+
+        with (
+            mock.patch.object(LocMemCache, "get_many") as mock_get_many,
+            mock.patch.object(LocMemCache, "get") as mock_get,
+        ):
+            self.assertCacheHit()
+        mock_get_many.assert_not_called()
+        mock_get.assert_not_called()
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_SECONDS=0)
+    def test_local_expired(self):
+        response = self.assertCacheHit(hit=False)
+        marker_key, entry_key = response.wsgi_request._cache_keys
+        self.assertCacheHit()
+
+        # Checked against the shared cache again.
+        cache.delete(entry_key)
+        self.assertCacheHit(hit=False)
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=0)
+    def test_local_disabled(self):
+        self.assertCacheHit(hit=False)
+        self.assertCacheHit()
+        self.assertEqual(len(local_cache), 0)
+
+
+class LocalPageCacheTestCase(TestCase):
+    def setUp(self):
+        self.cache = LocalPageCache()
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=2)
+    def test_max_entries(self):
+        self.cache.set("foo", HttpResponse("foo"))
+        self.cache.set("bar", HttpResponse("bar"))
+        self.cache.get("foo")
+        self.cache.set("baz", HttpResponse("baz"))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNotNone(self.cache.get("foo"))
+        self.assertIsNone(self.cache.get("bar"))
+        self.assertIsNotNone(self.cache.get("baz"))
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=10, FOLIOBLOG_CACHE_LOCAL_MAX_BYTES=10)
+    def test_max_bytes(self):
+        self.cache.set("foo", HttpResponse("a" * 6))
+        self.cache.set("bar", HttpResponse("b" * 6))
+        self.assertIsNone(self.cache.get("foo"))
+        self.assertIsNotNone(self.cache.get("bar"))
+
+        self.cache.set("baz", HttpResponse("c" * 11))
+        self.assertIsNone(self.cache.get("baz"))
+        self.assertEqual(self.cache._size, 6)
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=10, FOLIOBLOG_CACHE_LOCAL_SECONDS=0)
+    def test_expired(self):
+        self.cache.set("foo", HttpResponse("foo"))
+        self.assertIsNone(self.cache.get("foo"))
+        self.assertEqual(len(self.cache), 0)
+
+    @override_settings(FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES=10)
+    def test_copy(self):
+        self.cache.set("foo", HttpResponse("foo"))
+
+        response = self.cache.get("foo")
+        response.content = b"bar"
+        response["X-Foo"] = "bar"
+
+        response = self.cache.get("foo")
+        self.assertEqual(response.content, b"foo")
+        self.assertFalse(response.has_header("X-Foo"))
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class QueryParamsCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.index = BlogIndexPageFactory()
+        cls.page = BlogPageFactory(parent=cls.index)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertCacheHit(self, url, hit=True):
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if hit:
+            self.assertEqual(len(cm.captured_queries), 0)
+        else:
+            self.assertGreater(len(cm.captured_queries), 0)
+
+    def test_learn_query_params(self):
+        self.assertCacheHit(self.index.url, hit=False)
+        query_params = get_cache().get(query_params_key(self.site.pk, self.index.relative_url(self.site)))
+        self.assertEqual(query_params, sorted(BlogIndexPage.cache_query_params))
+
+    def test_forget_query_params(self):
+        # i.e: the index page was replaced by another page at the same path.
+        key = query_params_key(self.site.pk, self.page.relative_url(self.site))
+        get_cache().set(key, ["page"])
+        self.assertCacheHit(self.page.url, hit=False)
+        self.assertIsNone(get_cache().get(key))
+
+        self.assertCacheHit(f"{self.page.url}?page=2", hit=False)
+
+    def test_query_params_timeout(self):
+        with mock.patch.object(LocMemCache, "set", autospec=True, side_effect=LocMemCache.set) as mock_set:
+            self.assertCacheHit(self.index.url, hit=False)
+
+        key = query_params_key(self.site.pk, self.index.relative_url(self.site))
+        timeouts = [c.args[3] for c in mock_set.call_args_list if c.args[1] == key]
+        self.assertEqual(timeouts, [settings.CACHE_MIDDLEWARE_SECONDS])
+
+    def test_query_params_legacy(self):
+        # Functions stored by previous versions are replaced on the next store.
+        key = query_params_key(self.site.pk, self.index.relative_url(self.site))
+        get_cache().set(key, {"ajax": normalize_flag})
+        self.assertCacheHit(self.index.url, hit=False)
+        self.assertCacheHit(f"{self.index.url}?page=2", hit=False)
+
+    def test_normalize_unknown(self):
+        self.assertCacheHit(self.index.url, hit=False)
+        self.assertCacheHit(f"{self.index.url}?utm_source=foo&fbclid=bar")
+
+    def test_normalize_order(self):
+        self.assertCacheHit(self.index.url, hit=False)
+
+        self.assertCacheHit(f"{self.index.url}?ajax=1&page=2&category=foo", hit=False)
+        self.assertCacheHit(f"{self.index.url}?category=foo&page=02&ajax=true")
+        self.assertCacheHit(f"{self.index.url}?page=2&category=bar&ajax=1", hit=False)
+
+    def test_normalize_first_page(self):
+        self.assertCacheHit(self.index.url, hit=False)
+        self.assertCacheHit(f"{self.index.url}?page=1")
+        self.assertCacheHit(f"{self.index.url}?page=foo")
+        self.assertCacheHit(f"{self.index.url}?page=")
+
+    def test_no_query_params(self):
+        self.assertCacheHit(self.page.url, hit=False)
+        self.assertCacheHit(f"{self.page.url}?foo=bar", hit=False)
+        self.assertIsNone(get_cache().get(query_params_key(self.site.pk, self.page.url)))
+
+
+class CacheUrlTestCase(TestCase):
+    query_params = ["ajax", "collection", "name", "page"]
+
+    def get_cache_url(self, query, query_params=query_params):
+        return get_cache_url(RequestFactory().get(f"/foo/?{query}"), query_params)
+
+    def test_unknown_page(self):
+        self.assertEqual(self.get_cache_url("b=1&a=2", None), "http://testserver/foo/?b=1&a=2")
+
+    def test_sorted(self):
+        self.assertEqual(self.get_cache_url("page=2&ajax=1"), "http://testserver/foo/?ajax=1&page=2")
+
+    def test_last_value(self):
+        self.assertEqual(self.get_cache_url("name=a&name=b"), "http://testserver/foo/?name=b")
+
+    def test_dropped(self):
+        self.assertEqual(self.get_cache_url("foo=bar&name=&ajax=&page=1"), "http://testserver/foo/")
+
+    def test_page_number(self):
+        self.assertEqual(self.get_cache_url("page=03"), "http://testserver/foo/?page=3")
+        self.assertEqual(self.get_cache_url("page=-3"), "http://testserver/foo/?page=0")
+        self.assertEqual(self.get_cache_url("page=1.5"), "http://testserver/foo/")
+
+    def test_int(self):
+        self.assertEqual(self.get_cache_url("collection=007"), "http://testserver/foo/?collection=7")
+        self.assertEqual(self.get_cache_url("collection=foo"), "http://testserver/foo/?collection=foo")
+
+    def test_quoted(self):
+        self.assertEqual(self.get_cache_url("name=%C3%A9t%C3%A9"), "http://testserver/foo/?name=%C3%A9t%C3%A9")
+
+    @mock.patch("folioblog.core.utils.time.time", return_value=settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS * 3)
+    def test_seed(self, mock_time):
+        query_params = ["seed"]
+        self.assertEqual(self.get_cache_url("seed=2", query_params), "http://testserver/foo/?seed=2")
+        self.assertEqual(self.get_cache_url("seed=3", query_params), "http://testserver/foo/")
+        self.assertEqual(self.get_cache_url("seed=1", query_params), "http://testserver/foo/")
+        self.assertEqual(self.get_cache_url("seed=foo", query_params), "http://testserver/foo/")
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class WarmupQueueCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.index = BlogIndexPageFactory()
+        cls.page = BlogPageFactory(parent=cls.index)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connect_cache_signal()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    @override_settings(FOLIOBLOG_CACHE_WARMUP_QUEUE=True)
+    def test_queue(self):
+        self.client.get(self.page.url)
+        self.client.get(f"{self.index.url}?ajax=1&page=1", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+
+        self.page.save()
+
+        queue = {item.url: item for item in WarmupURL.objects.all()}
+        self.assertEqual(len(queue), 2)
+        self.assertFalse(queue[f"http://testserver{self.page.url}"].ajax)
+        self.assertTrue(queue[f"http://testserver{self.index.url}?ajax=1"].ajax)
+        self.assertEqual(queue[f"http://testserver{self.page.url}"].site, self.site)
+
+    @override_settings(FOLIOBLOG_CACHE_WARMUP_QUEUE=True)
+    def test_queue_normalized(self):
+        self.client.get(f"{self.index.url}?category={self.page.category.slug}&page=1&utm_source={'x' * 4096}")
+
+        self.page.save()
+        self.assertListEqual(
+            list(WarmupURL.objects.values_list("url", flat=True)),
+            [f"http://testserver{self.index.url}?category={self.page.category.slug}"],
+        )
+
+    @override_settings(FOLIOBLOG_CACHE_WARMUP_QUEUE=True)
+    def test_queue_too_long(self):
+        # Unknown query params are kept for pages without any declared.
+        self.client.get(self.page.url)
+        self.client.get(f"{self.page.url}?foo={'x' * 4096}")
+
+        self.page.save()
+        self.assertListEqual(
+            list(WarmupURL.objects.values_list("url", flat=True)),
+            [f"http://testserver{self.page.url}"],
+        )
+
+    @override_settings(FOLIOBLOG_CACHE_WARMUP_QUEUE=True)
+    def test_queue_again(self):
+        self.client.get(self.page.url)
+        self.page.save()
+        created_at = WarmupURL.objects.get().created_at
+
+        self.client.get(self.page.url)
+        self.page.save()
+        self.assertGreater(WarmupURL.objects.get().created_at, created_at)
+
+    def test_queue_disabled(self):
+        self.client.get(self.page.url)
+        self.page.save()
+        self.assertFalse(WarmupURL.objects.exists())
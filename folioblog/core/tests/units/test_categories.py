@@ -0,0 +1,170 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from wagtail.models import Site
+
+from folioblog.blog.factories import (
+    BlogCategoryFactory,
+    BlogIndexPageFactory,
+    BlogPageFactory,
+)
+from folioblog.blog.models import BlogCategory, BlogIndexPage, BlogPage
+from folioblog.core.cache import start_tracking, stop_tracking
+from folioblog.core.categories import (
+    build_category_stats,
+    category_stats_key,
+    get_category_senders,
+    get_category_stats,
+)
+from folioblog.core.factories import BasicPageFactory
+from folioblog.video.factories import (
+    VideoCategoryFactory,
+    VideoIndexPageFactory,
+    VideoPageFactory,
+)
+from folioblog.video.models import VideoCategory, VideoIndexPage, VideoPage
+
+
+class CategoryStatsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.page = BlogIndexPageFactory()
+        cls.language_code = cls.page.locale.language_code
+
+        cls.cat_foo = BlogCategoryFactory(name="foo")
+        cls.cat_bar = BlogCategoryFactory(name="bar")
+        cls.cat_baz = BlogCategoryFactory(name="baz")
+
+        BlogPageFactory(parent=cls.page, category=cls.cat_foo)
+        BlogPageFactory(parent=cls.page, category=cls.cat_foo)
+        BlogPageFactory(parent=cls.page, category=cls.cat_bar)
+        BlogPageFactory(parent=cls.page, category=cls.cat_bar, live=False)
+        BlogPageFactory(parent=BlogIndexPageFactory(slug="other"), category=cls.cat_baz)
+
+    def tearDown(self):
+        cache.delete(category_stats_key(self.site.pk, self.language_code, self.page.pk))
+
+    def test_build(self):
+        stats = build_category_stats(self.page, self.site.pk, self.language_code)
+        self.assertEqual(stats["total"], 3)
+        self.assertListEqual(
+            stats["categories"],
+            [
+                {"pk": self.cat_bar.pk, "name": "bar", "value": "bar", "total": 1},
+                {"pk": self.cat_baz.pk, "name": "baz", "value": "baz", "total": 0},
+                {"pk": self.cat_foo.pk, "name": "foo", "value": "foo", "total": 2},
+            ],
+        )
+
+    def test_build_language(self):
+        stats = build_category_stats(self.page, self.site.pk, "xx")
+        self.assertEqual(stats["total"], 0)
+        self.assertListEqual(stats["categories"], [])
+
+    def test_build_hide_empty(self):
+        page = VideoIndexPageFactory(parent=self.page.get_parent())
+        VideoCategoryFactory(name="foo")
+        video = VideoPageFactory(parent=page, category__name="bar")
+
+        stats = build_category_stats(page, self.site.pk, self.language_code)
+        self.assertEqual(stats["total"], 1)
+        self.assertListEqual([c["pk"] for c in stats["categories"]], [video.category.pk])
+
+    def test_dependencies(self):
+        start_tracking()
+        get_category_stats(self.page, self.site.pk, self.language_code)
+        collector = stop_tracking()
+
+        self.assertIn(("blog.blogcategory", None), collector.dependencies)
+        self.assertIn(("blog.blogcategory", self.cat_foo.pk), collector.dependencies)
+        self.assertIn(("blog.blogcategory", self.cat_baz.pk), collector.dependencies)
+
+
+class CategoryStatsCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        cls.page = BlogIndexPageFactory()
+        cls.language_code = cls.page.locale.language_code
+        cls.category = BlogCategoryFactory(name="foo")
+        cls.post = BlogPageFactory(parent=cls.page, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get_stats(self):
+        return get_category_stats(self.page, self.site.pk, self.language_code)
+
+    def test_cached(self):
+        self.get_stats()
+        with self.assertNumQueries(0):
+            stats = self.get_stats()
+        self.assertEqual(stats["total"], 1)
+
+    def test_publish(self):
+        self.get_stats()
+        post = BlogPageFactory(parent=self.page, category=self.category, live=False)
+        self.assertEqual(self.get_stats()["total"], 1)
+
+        post.save_revision().publish()
+        with self.assertNumQueries(0):
+            stats = self.get_stats()
+        self.assertEqual(stats["total"], 2)
+        self.assertEqual(stats["categories"][0]["total"], 2)
+
+    def test_unpublish(self):
+        self.get_stats()
+        self.post.unpublish()
+        with self.assertNumQueries(0):
+            stats = self.get_stats()
+        self.assertEqual(stats["total"], 0)
+
+    def test_delete(self):
+        self.get_stats()
+        self.post.delete()
+        self.assertEqual(self.get_stats()["total"], 0)
+
+    def test_revision(self):
+        stats = self.get_stats()
+        self.post.title = "Draft"
+        self.post.save_revision()
+        self.assertEqual(self.get_stats(), stats)
+
+    def test_category(self):
+        self.get_stats()
+        self.category.name = "bar"
+        self.category.save()
+        self.assertIsNone(cache.get(category_stats_key(self.site.pk, self.language_code, self.page.pk)))
+        self.assertEqual(self.get_stats()["categories"][0]["name"], "bar")
+
+    def test_render(self):
+        self.client.get(self.page.url)
+        self.assertEqual(cache.get(category_stats_key(self.site.pk, self.language_code, self.page.pk))["total"], 1)
+
+    def test_render_stale(self):
+        # i.e: refreshed by another process only, but posts are still listed.
+        cache.set(category_stats_key(self.site.pk, self.language_code, self.page.pk), {"total": 0, "categories": []})
+        response = self.client.get(self.page.url)
+        self.assertListEqual([p.pk for p in response.context["blogpages"]], [self.post.pk])
+
+    def test_senders(self):
+        self.assertDictEqual(
+            get_category_senders(),
+            {
+                BlogPage: BlogIndexPage,
+                BlogCategory: BlogIndexPage,
+                VideoPage: VideoIndexPage,
+                VideoCategory: VideoIndexPage,
+            },
+        )
+
+    def test_other_models(self):
+        with mock.patch("folioblog.core.signals.update_category_stats") as mock_update:
+            BasicPageFactory()
+        mock_update.assert_not_called()
@@ -1,14 +1,24 @@
+import gzip
+import zlib
+from datetime import timedelta
+
 from django.conf import settings
 from django.core.cache import cache
 from django.db import connection
-from django.test import TestCase, modify_settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.test import RequestFactory, TestCase, modify_settings, override_settings
 from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.utils.cache import has_vary_header
+from django.utils import timezone
+from django.utils.cache import has_vary_header, patch_cache_control
+from django.utils.http import http_date
 
-from wagtail.models import PageViewRestriction
+from wagtail.models import PageViewRestriction, Site
 
-from folioblog.blog.factories import BlogIndexPageFactory
+from folioblog.blog.factories import BlogIndexPageFactory, BlogPageFactory
+from folioblog.core.apps import connect_cache_signal, disconnect_cache_signal
+from folioblog.core.factories import FolioBlogSettingsFactory
+from folioblog.core.middleware import AnonymousUpdateCacheMiddleware
 from folioblog.user.factories import UserFactory
 
 
@@ -93,6 +103,31 @@ class AnonymousCacheMiddlewareTestCase(TestCase):
         self.assertEqual(count, 0)
         self.assertIn("max-age=", response.headers.get("cache-control", ""))
 
+    def test_anonymous_head(self):
+        # No cache yet
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.head(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(count, 0)
+
+        # Cache hit
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.head(self.page.url)
+        count = len([q["sql"] for q in cm.captured_queries])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(count, 0)
+
+    def test_anonymous_post(self):
+        response = self.client.post(self.page.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("max-age=", response.headers.get("cache-control", ""))
+
+    def test_anonymous_not_found(self):
+        response = self.client.get("/givemea404please/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("max-age=", response.headers.get("cache-control", ""))
+
     def test_authenticated(self):
         self.client.force_login(self.user)
 
@@ -200,3 +235,222 @@ class CountQueriesMiddlewareTestCase(TestCase):
             response = self.client.get(self.page.url)
         self.assertEqual(response.status_code, 200)
         self.assertIn("SQL QUERIES on", cm.output[0])
+
+
+class AnonymousUpdateCacheMiddlewareTestCase(TestCase):
+    def setUp(self):
+        self.middleware = AnonymousUpdateCacheMiddleware(lambda r: HttpResponse())
+
+        self.request = RequestFactory().get("/")
+        self.request._cache_update_cache = True
+        self.request._cache_site_id = Site.objects.get(is_default_site=True).pk
+        self.request._cache_keys = ("test.marker", "test.entry")
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_response(self):
+        response = self.middleware.process_response(self.request, HttpResponse("foo"))
+        self.assertIn("max-age=", response.headers.get("cache-control", ""))
+        self.assertIsNotNone(cache.get("test.entry"))
+
+    def test_private(self):
+        response = HttpResponse("foo")
+        patch_cache_control(response, private=True)
+
+        self.middleware.process_response(self.request, response)
+        self.assertIsNone(cache.get("test.entry"))
+
+    def test_max_age_zero(self):
+        response = HttpResponse("foo")
+        patch_cache_control(response, max_age=0)
+
+        self.middleware.process_response(self.request, response)
+        self.assertIsNone(cache.get("test.entry"))
+
+    def test_max_age(self):
+        response = HttpResponse("foo")
+        patch_cache_control(response, max_age=60)
+
+        self.middleware.process_response(self.request, response)
+        self.assertIsNotNone(cache.get("test.entry"))
+
+    def test_not_modified(self):
+        response = self.middleware.process_response(self.request, HttpResponseNotModified())
+        self.assertIn("max-age=", response.headers.get("cache-control", ""))
+        self.assertIsNone(cache.get("test.entry"))
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class AnonymousCacheCompressionMiddlewareTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.page = BlogIndexPageFactory()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_compressed_accepted(self):
+        response = self.client.get(self.page.url)
+        content = response.content
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertTrue(has_vary_header(response, "Accept-Encoding"))
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.content))
+        self.assertTrue(has_vary_header(response, "Accept-Encoding"))
+        self.assertEqual(gzip.decompress(response.content), content)
+
+    def test_compressed_not_accepted(self):
+        content = self.client.get(self.page.url).content
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="br")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(int(response.headers["Content-Length"]), len(content))
+        self.assertEqual(response.content, content)
+
+    def test_compressed_refused(self):
+        content = self.client.get(self.page.url).content
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip;q=0, deflate")
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.content, content)
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="*;q=0.5, gzip; q=0")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test_compressed_wildcard(self):
+        self.client.get(self.page.url)
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="br, *;q=0.1")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="xgzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    @override_settings(FOLIOBLOG_CACHE_COMPRESS_ENCODING="deflate")
+    def test_compressed_encoding(self):
+        content = self.client.get(self.page.url).content
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="deflate")
+        self.assertEqual(response.headers["Content-Encoding"], "deflate")
+        self.assertEqual(zlib.decompress(response.content), content)
+
+    @override_settings(FOLIOBLOG_CACHE_COMPRESS_ENCODING="foo")
+    def test_compressed_encoding_unknown(self):
+        self.client.get(self.page.url)
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+
+    @override_settings(FOLIOBLOG_CACHE_COMPRESS_MIN_LENGTH=10 * 1024 * 1024)
+    def test_compressed_threshold(self):
+        self.client.get(self.page.url)
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    @override_settings(FOLIOBLOG_CACHE_COMPRESS_MIN_LENGTH=None)
+    def test_compressed_disabled(self):
+        response = self.client.get(self.page.url)
+        self.assertFalse(has_vary_header(response, "Accept-Encoding"))
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+@modify_settings(
+    MIDDLEWARE={
+        "prepend": ["folioblog.core.middleware.AnonymousUpdateCacheMiddleware"],
+        "append": ["folioblog.core.middleware.AnonymousFetchCacheMiddleware"],
+    }
+)
+class AnonymousCacheConditionalMiddlewareTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site = Site.objects.get(is_default_site=True)
+        FolioBlogSettingsFactory(site=cls.site)
+
+        cls.last_published_at = timezone.now().replace(microsecond=0)
+        cls.index = BlogIndexPageFactory(last_published_at=cls.last_published_at - timedelta(days=1))
+        cls.page = BlogPageFactory(parent=cls.index, last_published_at=cls.last_published_at)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        connect_cache_signal()
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect_cache_signal()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertConditional(self, url, **kwargs):
+        response = self.client.get(url, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **kwargs)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(len(cm.captured_queries), 0)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"foo"', **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page(self):
+        response = self.assertConditional(self.page.url)
+        self.assertEqual(response["Last-Modified"], http_date(self.last_published_at.timestamp()))
+
+    def test_index(self):
+        # Listing of pages, the newest one wins.
+        response = self.assertConditional(self.index.url)
+        self.assertEqual(response["Last-Modified"], http_date(self.last_published_at.timestamp()))
+
+    def test_rss(self):
+        self.assertConditional(reverse("rss"))
+
+    def test_sitemap(self):
+        self.assertConditional(reverse("sitemap"))
+
+    def test_modified_since(self):
+        self.client.get(self.page.url)
+
+        since = http_date((self.last_published_at + timedelta(hours=1)).timestamp())
+        response = self.client.get(self.page.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 304)
+
+        since = http_date((self.last_published_at - timedelta(hours=1)).timestamp())
+        response = self.client.get(self.page.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+
+    def test_compressed(self):
+        etag = self.client.get(self.page.url)["ETag"]
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["ETag"], f'{etag[:-1]}-gzip"')
+
+        response = self.client.get(self.page.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.page.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
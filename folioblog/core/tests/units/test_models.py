@@ -1,10 +1,18 @@
+from importlib import import_module
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from wagtail.images import get_image_model
 
 from wagtail_factories import CollectionFactory
 
-from folioblog.core.factories import ImageFactory
+from folioblog.blog.factories import BlogIndexPageFactory, BlogPageFactory
+from folioblog.core.factories import BasicPageFactory, ImageFactory
+from folioblog.core.models import ImageUsage
+from folioblog.core.renditions import SPECS
 
 Image = get_image_model()
 
@@ -28,3 +36,111 @@ class ImageModelTestCase(TestCase):
         self.assertEqual(image.renditions.count(), 1)
         rendition = image.renditions.first()
         self.assertIn("bar", rendition.url)
+
+
+class ImageBulkRenditionsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.portrait = ImageFactory(file__width=300, file__height=500)
+        cls.landscape = ImageFactory(file__width=500, file__height=300)
+        cls.images = [cls.portrait, cls.landscape]
+
+    def test_missing(self):
+        self.portrait.get_rendition(SPECS["gallery_portrait"]["image_full"])
+
+        renditions = Image.get_bulk_renditions(self.images, "gallery")
+
+        for image, role in [(self.portrait, "gallery_portrait"), (self.landscape, "gallery_landscape")]:
+            self.assertListEqual(list(renditions[image.pk]), list(SPECS[role]))
+            for name, spec in SPECS[role].items():
+                self.assertEqual(renditions[image.pk][name].filter_spec, spec)
+            self.assertEqual(image.renditions.count(), len(SPECS[role]))
+
+    def test_existing(self):
+        Image.get_bulk_renditions(self.images, "gallery")
+
+        with CaptureQueriesContext(connection) as cm:
+            renditions = Image.get_bulk_renditions(self.images, "gallery")
+            # Even their image is already there.
+            self.assertEqual(renditions[self.portrait.pk]["image_full"].image, self.portrait)
+
+        self.assertEqual(len(cm.captured_queries), 1)
+
+
+class ImageUsageTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.image = ImageFactory()
+        cls.image_body = ImageFactory()
+
+    def get_usages(self, page):
+        return dict(ImageUsage.objects.filter(page=page).values_list("image_id", "caption"))
+
+    def test_page_image(self):
+        page = BasicPageFactory(image=self.image, image_alt="foo", body="")
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "foo"})
+
+    def test_page_body(self):
+        page = BasicPageFactory(
+            image=self.image,
+            image_alt="",
+            body=(
+                f'<p>foo</p><embed alt="Foo" embedtype="image" format="left" id="{self.image_body.pk}"/>'
+                f'<embed embedtype="media" url="https://example.com"/>'
+                f'<embed alt="Missing" embedtype="image" format="left" id="0"/>'
+            ),
+        )
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "", self.image_body.pk: "Foo"})
+
+    def test_page_other_images(self):
+        page = BlogPageFactory(
+            parent=BlogIndexPageFactory(),
+            image=self.image,
+            image_alt="foo",
+            image_body=self.image_body,
+            body="",
+        )
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "foo", self.image_body.pk: ""})
+
+    def test_page_updated(self):
+        page = BasicPageFactory(image=self.image, image_alt="foo", body="")
+        page.image = self.image_body
+        page.save()
+        self.assertDictEqual(self.get_usages(page), {self.image_body.pk: "foo"})
+
+    def test_page_draft(self):
+        page = BasicPageFactory(image=self.image, image_alt="foo", body="")
+        page.image_alt = "bar"
+        page.save_revision()
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "foo"})
+
+        page.get_latest_revision().publish()
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "bar"})
+
+    def test_page_unpublished(self):
+        page = BasicPageFactory(image=self.image, body="")
+        page.unpublish()
+        self.assertDictEqual(self.get_usages(page), {})
+
+    def test_image_deleted(self):
+        image = ImageFactory()
+        page = BasicPageFactory(image=self.image, body=f'<embed alt="" embedtype="image" id="{image.pk}"/>')
+        image.delete()
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: page.image_alt})
+
+    def test_migration(self):
+        image = ImageFactory()
+        page = BasicPageFactory(
+            image=self.image,
+            image_alt="foo",
+            body=(
+                f'<embed alt="bar &amp; baz" embedtype="image" id="{image.pk}"/>'
+                f'<embed alt="qux" embedtype="image" id="{image.pk}"/>'
+            ),
+        )
+        ImageUsage.objects.all().delete()
+
+        migration = import_module("folioblog.core.migrations.0023_build_imageusages")
+        state = MigrationExecutor(connection).loader.project_state(("core", "0023_build_imageusages"))
+        migration.build_image_usages(state.apps, None)
+        self.assertDictEqual(self.get_usages(page), {self.image.pk: "foo", image.pk: "bar & baz"})
@@ -1,6 +1,7 @@
 from html import unescape
 from pathlib import Path
 
+from django.template import Context, Template
 from django.test import TestCase
 
 from wagtail.models import Site
@@ -9,6 +10,7 @@ from wagtail_factories import SiteFactory
 
 from folioblog.core.factories import BasicPageFactory, ImageFactory
 from folioblog.core.factories.images import PhotographerFactory
+from folioblog.core.renditions import SPECS
 
 
 class PhotoCreditTemplateTagTestCase(TestCase):
@@ -68,3 +70,36 @@ class PhotoCreditMultiDomainTemplateTagTestCase(TestCase):
 
         self.assertEqual(len(list(response.context["photographers"])), 1)
         self.assertIn(self.photographer, list(response.context["photographers"]))
+
+
+class RenditionsTemplateTagTestCase(TestCase):
+    def render(self, image, role):
+        template = Template(
+            "{% load folioblog %}{% renditions image role %}"
+            "{% for name in names %}{% if forloop.counter0 %},{% endif %}{{ name }}{% endfor %}"
+        )
+        context = Context({"image": image, "role": role})
+        return template.render(context), context
+
+    def test_role(self):
+        image = ImageFactory(file__width=500, file__height=300)
+        html, context = self.render(image, "blog_index_item")
+
+        for name, spec in SPECS["blog_index_item"].items():
+            self.assertEqual(context[name].filter_spec, spec)
+        self.assertEqual(image.renditions.count(), len(SPECS["blog_index_item"]))
+
+    def test_role_orientation(self):
+        portrait = ImageFactory(file__width=300, file__height=500)
+        html, context = self.render(portrait, "og")
+        self.assertEqual(context["og_image"].filter_spec, SPECS["og_portrait"]["og_image"])
+
+        landscape = ImageFactory(file__width=500, file__height=300)
+        html, context = self.render(landscape, "og")
+        self.assertEqual(context["og_image"].filter_spec, SPECS["og_landscape"]["og_image"])
+
+    def test_no_image(self):
+        html, context = self.render(None, "youtube_player")
+        self.assertEqual(html, "")
+        self.assertIsNone(context["thumbnail_xs"])
+        self.assertIsNone(context["thumbnail_lg"])
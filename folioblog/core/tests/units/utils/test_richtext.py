@@ -1,6 +1,9 @@
 from unittest import TestCase
 
-from folioblog.core.utils.richtext import richtext_extract_image_attrs
+from folioblog.core.utils.richtext import (
+    richtext_extract_image_attrs,
+    richtext_extract_images,
+)
 
 
 class RichTextUtilsTestCase(TestCase):
@@ -10,3 +13,27 @@ class RichTextUtilsTestCase(TestCase):
     def test_extract_image_wrong_type(self):
         html = '<embed alt="Foo" embedtype="media" url="http://example.com" id="0"/>'
         self.assertIsNone(richtext_extract_image_attrs(0, html))
+
+    def test_extract_image(self):
+        html = '<p>foo</p><embed alt="Foo" embedtype="image" format="left" id="1"/>'
+        self.assertEqual(richtext_extract_image_attrs("1", html), "Foo")
+
+    def test_extract_images(self):
+        html = (
+            '<embed alt="Foo" embedtype="image" format="left" id="1"/>'
+            '<embed alt="Foo" embedtype="media" url="http://example.com"/>'
+            '<embed alt="Bar" embedtype="image" format="right" id="2"/>'
+            '<embed alt="Baz" embedtype="image" format="right" id="foo"/>'
+        )
+        images = richtext_extract_images(html)
+        self.assertListEqual(list(images), [1, 2])
+        self.assertEqual(images[1]["alt"], "Foo")
+        self.assertEqual(images[2]["format"], "right")
+
+    def test_extract_image_repeated(self):
+        html = (
+            '<embed alt="Foo" embedtype="image" format="left" id="1"/>'
+            '<embed alt="Bar" embedtype="image" format="right" id="1"/>'
+        )
+        self.assertEqual(richtext_extract_image_attrs(1, html), "Foo")
+        self.assertEqual(richtext_extract_images(html)[1]["format"], "left")
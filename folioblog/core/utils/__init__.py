@@ -1,3 +1,8 @@
+import socket
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
 from django.utils.translation import get_language
 
 
@@ -7,3 +12,33 @@ def get_block_language(blocks, langcode=None):
     for block in blocks:
         if block.value["language"] == langcode:
             return block.value
+
+
+def get_shuffle_seed(value=None):
+    """
+    Seed of shuffles, rotated every period. A given seed is only kept if it is
+    the current or the previous one (i.e: following pages of a shuffle served
+    just before the rotation), so that any integer can't make a new shuffle.
+    """
+    period = settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS
+    current = int(time.time() // period) if period else 0
+
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        return current
+    return seed if seed in ({current, current - 1} if period else {current}) else current
+
+
+@contextmanager
+def socket_timeout(timeout):
+    """
+    Set the default timeout of sockets meanwhile, for network calls without
+    any (i.e: Wagtail oEmbed finders).
+    """
+    default_timeout = socket.getdefaulttimeout()
+    socket.setdefaulttimeout(timeout)
+    try:
+        yield
+    finally:
+        socket.setdefaulttimeout(default_timeout)
@@ -1,14 +1,24 @@
 from wagtail.rich_text.rewriters import FIND_EMBED_TAG, extract_attrs
 
 
-def richtext_extract_image_attrs(image_id, html):
+def richtext_extract_images(html):
     """
-    Helper to extract embed image attribute alt from RichTextField().
-    Didn't find any explicit helper for this in Wagtail source.
+    Return attributes of all images embedded in a RichTextField(), keyed by
+    their ids, in a single pass.
 
     @see EmbedRewriter.extract_references()
     """
+    images = {}
     for match in FIND_EMBED_TAG.findall(html):
         attrs = extract_attrs(match)
-        if attrs.get("embedtype") == "image" and attrs.get("id") == image_id:
-            return attrs.get("alt")
+        if attrs.get("embedtype") == "image" and attrs.get("id", "").isdigit():
+            images.setdefault(int(attrs["id"]), attrs)
+    return images
+
+
+def richtext_extract_image_attrs(image_id, html):
+    """
+    Helper to extract embed image attribute alt from RichTextField().
+    Didn't find any explicit helper for this in Wagtail source.
+    """
+    return richtext_extract_images(html).get(int(image_id), {}).get("alt")
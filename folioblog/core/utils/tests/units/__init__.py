@@ -1,2 +1,2 @@
-from .base import SiteRootPageSwitchTestCase  # noqa
+from .base import SiteRootPageSwitchTestCase, SyncExecutor  # noqa
 from .html import BaseHTMLPage, BaseIndexHTMLPage  # noqa
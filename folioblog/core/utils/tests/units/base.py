@@ -1,3 +1,5 @@
+from concurrent.futures import Future
+
 from django.test import TestCase
 
 from wagtail.models import Site
@@ -18,3 +20,27 @@ class SiteRootPageSwitchTestCase(TestCase):
         super().tearDownClass()
         # THEN clear site root path cache! Take me a while before found it!
         Site.clear_site_root_paths_cache()
+
+
+class SyncExecutor:
+    """
+    Run jobs of a pool executor in the current process (i.e: in the test
+    transaction).
+    """
+
+    def __init__(self, max_workers=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
@@ -7,6 +7,7 @@ from wagtail.api.v2.views import PagesAPIViewSet
 from wagtail.models import Site
 
 from folioblog.blog.models import BlogIndexPage, BlogPage
+from folioblog.core.cache import collect_listing
 from folioblog.core.managers import qs_in_site_alt
 from folioblog.core.models import FolioBlogSettings
 from folioblog.core.utils import get_block_language
@@ -52,6 +53,8 @@ class RssView(TemplateView):
                 .order_by("-date")[: rss_feed.get("limit", 50)]
             )
 
+            collect_listing(BlogPage)
+
             context["feed_active"] = True
             context["feed_title"] = rss_feed.get("title", "RSS feed")
             context["feed_description"] = rss_feed.get("description", "")
@@ -1,3 +1,5 @@
+import random
+
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.utils.translation import get_language, pgettext
@@ -5,18 +7,19 @@ from django.utils.translation import get_language, pgettext
 from wagtail.admin.panels import FieldPanel, MultiFieldPanel
 from wagtail.fields import RichTextField
 from wagtail.images import get_image_model
-from wagtail.models import Collection, Page, ReferenceIndex, Site
+from wagtail.models import Collection, Site, get_page_models
 
-from folioblog.blog.models import BlogPage
-from folioblog.core.models import BaseIndexPage, BasicPage, FolioBlogSettings
-from folioblog.core.utils.richtext import richtext_extract_image_attrs
-from folioblog.video.models import VideoPage
+from folioblog.core.cache import collect_listing
+from folioblog.core.models import BaseIndexPage, BasePage, FolioBlogSettings, ImageUsage
+from folioblog.core.pagination import FolioBlogPaginator
+from folioblog.core.utils import get_shuffle_seed
 
 Image = get_image_model()
 
 
 class GalleryPage(BaseIndexPage):
     ajax_template = "gallery/gallery_page_ajax.html"
+    cache_query_params = ["ajax", "collection", "page", "seed"]
 
     gallery_title = models.CharField(max_length=512, blank=True, default="")
     gallery_text = RichTextField(blank=True)
@@ -31,6 +34,17 @@ class GalleryPage(BaseIndexPage):
         ),
     ]
 
+    @staticmethod
+    def get_current_seed():
+        return get_shuffle_seed()
+
+    def get_shuffle_seed(self, request):
+        """
+        The following pages send back the seed of the first one to keep its
+        order once rotated.
+        """
+        return get_shuffle_seed(request.GET.get("seed"))
+
     def get_context(self, request, *args, **kwargs):
         context = super().get_context(request, *args, **kwargs)
 
@@ -57,68 +71,70 @@ class GalleryPage(BaseIndexPage):
             collection_subquery = collection_qs.all()  # keep a copy/clone
 
         # Then collect images for these collections.
-        image_qs = (
-            Image.objects.filter(collection__in=collection_subquery)
-            .select_related("collection")
-            .prefetch_renditions()
-            .order_by("?")
+        # Shuffled in Python rather than with a costly ORDER BY random(), and
+        # always the same way for a while to be cached.
+        image_qs = Image.objects.filter(collection__in=collection_subquery)
+        image_ids = list(image_qs.order_by("pk").values_list("pk", flat=True))
+        seed = self.get_shuffle_seed(request)
+        random.Random(f"{self.pk}.{seed}").shuffle(image_ids)
+
+        # Then only load images of the requested page.
+        paginator = FolioBlogPaginator(image_ids, site_settings.gallery_pager_limit)
+        gallery_page = paginator.get_page(request.GET.get("page"))
+        image_ids = list(gallery_page)
+        images_by_id = image_qs.select_related("collection").in_bulk(image_ids)
+        gallery_images = [images_by_id[pk] for pk in image_ids]
+
+        # New images, or pages using them, change the gallery too.
+        collect_listing(Image, *[model for model in get_page_models() if issubclass(model, BasePage)])
+
+        # Load image usages precomputed on page save, latest pages last.
+        usages = (
+            ImageUsage.objects.filter(
+                image_id__in=image_ids,
+                locale__language_code=get_language(),
+                page__live=True,
+                page__path__startswith=root_page.path,
+            )
+            .values_list("image_id", "page_id", "page__content_type_id", "caption")
+            .order_by("page_id")
         )
 
-        # Load image usages in bulk thanks to reference index.
-        content_type_image = ContentType.objects.get_by_natural_key(Image._meta.app_label, Image._meta.model_name)
-        content_type_page = ContentType.objects.get_by_natural_key(Page._meta.app_label, Page._meta.model_name)
+        # Then preload SPECIFIC referenced pages, one query per page type.
+        page_ids = {}
+        for image_id, page_id, content_type_id, caption in usages:
+            page_ids.setdefault(content_type_id, set()).add(page_id)
 
-        ref_qs = ReferenceIndex.objects.filter(
-            to_content_type_id=content_type_image,
-            to_object_id__in=[i.pk for i in image_qs],
-            base_content_type=content_type_page,
-        )
-
-        # Preload SPECIFIC referenced pages first.
-        # Because BasePage is abstract (for good reason), we cannot use it...
         pages = {}
-        for SpecificPage in [BasicPage, BlogPage, VideoPage]:
-            page_qs = (
-                SpecificPage.objects.live()
-                .select_related("image__photographer")
-                .descendant_of(root_page)
-                .filter(
-                    locale__language_code=get_language(),
-                    id__in=[int(ref.object_id) for ref in ref_qs],
-                )
-            )
-            pages.update({p.pk: p for p in page_qs})
+        for content_type_id, ids in page_ids.items():
+            SpecificPage = ContentType.objects.get_for_id(content_type_id).model_class()
+            pages.update(SpecificPage.objects.select_related("image__photographer").in_bulk(ids))
 
         # Then attach latest available pages to image with custom alt if any.
         image_refs = {}
-        for ref in ref_qs:
-            page = pages.get(int(ref.object_id), None)
-            if page:
-                if ref.model_path.startswith("body."):
-                    caption = richtext_extract_image_attrs(ref.to_object_id, page.body)
-                elif ref.model_path == "image":  # pragma: no branch
-                    caption = page.image_alt
-                else:  # pragma: no cover
-                    caption = None
-
-                image_refs[int(ref.to_object_id)] = {
-                    "page": page,
-                    "caption": caption,
-                }
-
-        # Then build images with attached pages.
+        for image_id, page_id, content_type_id, caption in usages:
+            image_refs[image_id] = {
+                "page": pages[page_id],
+                "caption": caption,
+            }
+
+        # Then build images with attached pages and their renditions.
         images = []
-        for image in image_qs:
+        renditions = Image.get_bulk_renditions(gallery_images, "gallery")
+        for image in gallery_images:
             # Ugly: add/override properties on the fly!
             image.page = image_refs.get(image.pk, {}).get("page", None)
             image.caption = image_refs.get(image.pk, {}).get("caption") or image.caption
+            image.gallery_renditions = renditions[image.pk]
             images.append(image)
 
         context.update(
             {
                 "images": images,
+                "gallery_page": gallery_page,
                 "collection_options": collection_options,
                 "collection_filter": collection_filter,
+                "shuffle_seed": seed,
             }
         )
         return context
@@ -5,9 +5,12 @@
     let grid = document.querySelector('#gallery-packery .grid');
     let filterElem = document.querySelector('#gallery-filters');
     let buttonShuffle = document.querySelector('#button-shuffle');
+    // Keep the order of the first page, even if the shuffle rotates meanwhile.
+    let seed = grid.getAttribute('data-seed');
 
     let pckry = null;
     let lightbox = null;
+    let infScroll = null;
 
     function initPackery() {
         pckry = new Packery(grid, {
@@ -19,6 +22,34 @@
         toggleZoomFeature();
     }
 
+    function getPath() {
+        let href = '?ajax=1&page=' + (this.pageIndex + 1) + '&seed=' + seed;
+        let collection = filterElem.querySelector('a.dropdown-item.active').getAttribute('data-filter');
+        if (collection !== '*') {
+            href = href.concat('&collection=', collection.substring('collection-'.length));
+        }
+        return href;
+    }
+
+    function initInfiniteScroll() {
+        if (infScroll) {
+            infScroll.destroy();
+        }
+        // Items are appended into the wrapper replaced on filtering.
+        infScroll = new InfiniteScroll(grid.querySelector('.grid-items'), {
+            path: getPath,
+            append: '.grid-item',
+            outlayer: pckry,
+            history: false,
+            status: '.page-load-status',
+            hideNav: '.pagination'
+        });
+        infScroll.on('append', function (body, path, items) {
+            toggleZoomFeature(items);
+            lightbox.reload();
+        });
+    }
+
     function initGLightbox() {
         lightbox = GLightbox({loop: true});
     }
@@ -46,7 +77,7 @@
         });
     }
 
-    function toggleZoomFeature() {
+    function toggleZoomFeature(elems = [grid]) {
 
         function replaceIcon(zoomButton, iconElem, is_plus) {
             let newIconElem = document.createElement('i');
@@ -56,7 +87,10 @@
             iconElem.remove();
         }
 
-        let zoomButtons = grid.querySelectorAll('.grid-item-zoom-button');
+        let zoomButtons = [];
+        for (let elem of elems) {
+            zoomButtons.push(...elem.querySelectorAll('.grid-item-zoom-button'));
+        }
         for (let zoomButton of zoomButtons) {
 
             zoomButton.addEventListener('click', function (event) {
@@ -117,6 +151,7 @@
                 event.preventDefault();
 
                 let url = link.getAttribute('href');
+                url = url.concat('&seed=', seed);
                 if (window.fetch) {
                     fetch(url, {headers: new Headers({"X-Requested-With": "XMLHttpRequest"})})
                         .then(function (response) {
@@ -137,6 +172,9 @@
                             // Finally mark filter as active
                             filterElem.querySelector('a.dropdown-item.active').classList.remove('active');
                             link.classList.add('active');
+
+                            // And restart pagination for this filter
+                            initInfiniteScroll();
                         });
                 } else {
                     window.alert(gettext("Oula, ce navigateur Web a bien besoin d'être mis à jour !"));
@@ -152,6 +190,7 @@
             bindShuffle();
             bindFilters();
             initGLightbox();
+            initInfiniteScroll();
         }
     });
 })();
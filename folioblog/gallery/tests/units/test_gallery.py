@@ -1,5 +1,9 @@
+from unittest import mock
+
 from django.conf import settings
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from wagtail.images import get_image_model
 from wagtail.models import Site
@@ -12,6 +16,7 @@ from folioblog.core.factories import BasicPageFactory, ImageFactory, LocaleFacto
 from folioblog.core.models import BasicPage, FolioBlogSettings
 from folioblog.core.templatetags.folioblog import mimetype
 from folioblog.gallery.factories import GalleryPageFactory
+from folioblog.gallery.models import GalleryPage
 from folioblog.gallery.tests.units.htmlpages import GalleryHTMLPage
 from folioblog.home.factories import HomePageFactory
 
@@ -124,6 +129,130 @@ class GalleryPageTestCase(TestCase):
 
         self.assertEqual(response.context["images"][0].pk, image.pk)
 
+    def test_usages_queries(self):
+        images = ImageFactory.create_batch(4, collection=self.collections["post"])
+        BlogPageFactory(parent=self.page, image=images[0])
+        self.client.get(self.page.url)  # Generate renditions first.
+        with CaptureQueriesContext(connection) as cm:
+            self.client.get(self.page.url)
+        num_queries = len(cm.captured_queries)
+
+        for image in images[1:]:
+            body = f'<embed alt="Foo" embedtype="image" id="{image.pk}"/>'
+            BlogPageFactory(parent=self.page, image=image, body=body)
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+
+        self.assertEqual(len([i for i in response.context["images"] if i.page]), 4)
+        self.assertEqual(len(cm.captured_queries), num_queries)
+
+    def test_pagination(self):
+        images = ImageFactory.create_batch(5, collection=self.collections["post"])
+        site_settings = FolioBlogSettings.for_site(self.site)
+        site_settings.gallery_pager_limit = 2
+        site_settings.save()
+
+        pks = []
+        for page_num in [1, 2, 3]:
+            response = self.client.get(self.page.url, data={"page": page_num})
+            self.assertEqual(response.context["gallery_page"].number, page_num)
+            pks += [i.pk for i in response.context["images"]]
+        self.assertEqual(len(pks), 5)
+        self.assertCountEqual(pks, [i.pk for i in images])
+
+        response = self.client.get(self.page.url, data={"page": 4})
+        self.assertEqual(len(response.context["images"]), 0)
+
+    def test_pagination_ajax_filter(self):
+        ImageFactory.create_batch(3, collection=self.collections["post"])
+        ImageFactory.create_batch(3, collection=self.collections["video"])
+        site_settings = FolioBlogSettings.for_site(self.site)
+        site_settings.gallery_pager_limit = 2
+        site_settings.save()
+
+        response = self.client.get(
+            self.page.url,
+            data={"ajax": 1, "page": 2, "collection": self.collections["video"].pk},
+            headers={"x-requested-with": "XMLHttpRequest"},
+        )
+        self.assertTemplateUsed(response, "gallery/gallery_page_ajax.html")
+        self.assertEqual(len(response.context["images"]), 1)
+        self.assertEqual(response.context["images"][0].collection, self.collections["video"])
+        self.assertEqual(response.context["gallery_page"].paginator.num_pages, 2)
+
+    def test_renditions_queries(self):
+        ImageFactory.create_batch(2, collection=self.collections["post"])
+        self.client.get(self.page.url)  # Generate renditions first.
+        with CaptureQueriesContext(connection) as cm:
+            self.client.get(self.page.url)
+        num_queries = len(cm.captured_queries)
+
+        ImageFactory.create_batch(3, collection=self.collections["post"])
+        self.client.get(self.page.url)
+        with CaptureQueriesContext(connection) as cm:
+            response = self.client.get(self.page.url)
+
+        self.assertEqual(len(response.context["images"]), 5)
+        self.assertEqual(len(cm.captured_queries), num_queries)
+
+    def test_shuffle_same_order(self):
+        images = ImageFactory.create_batch(10, collection=self.collections["post"])
+
+        response = self.client.get(self.page.url)
+        pks = [i.pk for i in response.context["images"]]
+        self.assertCountEqual(pks, [i.pk for i in images])
+
+        response = self.client.get(self.page.url)
+        self.assertListEqual([i.pk for i in response.context["images"]], pks)
+
+    def test_shuffle_period(self):
+        ImageFactory.create_batch(10, collection=self.collections["post"])
+
+        with mock.patch("folioblog.core.utils.time.time", return_value=0):
+            response = self.client.get(self.page.url)
+            pks = [i.pk for i in response.context["images"]]
+        with mock.patch("folioblog.core.utils.time.time", return_value=settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS):
+            response = self.client.get(self.page.url)
+            self.assertNotEqual([i.pk for i in response.context["images"]], pks)
+
+    def test_shuffle_seed(self):
+        ImageFactory.create_batch(10, collection=self.collections["post"])
+
+        with mock.patch("folioblog.core.utils.time.time", return_value=0):
+            response = self.client.get(self.page.url)
+            pks = [i.pk for i in response.context["images"]]
+        self.assertEqual(response.context["shuffle_seed"], 0)
+        self.assertContains(response, 'data-seed="0"')
+
+        # Following pages keep the order of the first one once rotated.
+        with mock.patch("folioblog.core.utils.time.time", return_value=settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS):
+            response = self.client.get(f"{self.page.url}?seed=0")
+        self.assertListEqual([i.pk for i in response.context["images"]], pks)
+
+    def test_shuffle_seed_invalid(self):
+        response = self.client.get(f"{self.page.url}?seed=foo")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["shuffle_seed"], GalleryPage.get_current_seed())
+
+    def test_shuffle_seed_expired(self):
+        with mock.patch("folioblog.core.utils.time.time", return_value=settings.FOLIOBLOG_GALLERY_SHUFFLE_SECONDS * 3):
+            for seed in [0, 1, 4, 123456]:
+                response = self.client.get(f"{self.page.url}?seed={seed}")
+                self.assertEqual(response.context["shuffle_seed"], 3)
+
+            response = self.client.get(f"{self.page.url}?seed=2")
+            self.assertEqual(response.context["shuffle_seed"], 2)
+
+    @override_settings(FOLIOBLOG_GALLERY_SHUFFLE_SECONDS=0)
+    def test_shuffle_never(self):
+        ImageFactory.create_batch(10, collection=self.collections["post"])
+
+        response = self.client.get(self.page.url)
+        pks = [i.pk for i in response.context["images"]]
+        with mock.patch("folioblog.core.utils.time.time", return_value=0):
+            response = self.client.get(self.page.url)
+        self.assertListEqual([i.pk for i in response.context["images"]], pks)
+
 
 class GalleryPageNoSettingsTestCase(TestCase):
     @classmethod
@@ -1,6 +1,7 @@
 from html import unescape
 
 from django.conf import settings
+from django.template.loader import render_to_string
 from django.test import TestCase
 
 from wagtail.models import Site
@@ -89,6 +90,19 @@ class PortfolioPageTestCase(TestCase):
         self.assertIn(self.page.about_video.thumbnail.filename.split(".")[0], html)
 
 
+class PortfolioBlockNoImageTestCase(TestCase):
+    def test_experience(self):
+        html = render_to_string("portfolio/blocks/experience.html", {"value": {"photo": None}, "index": 0})
+        self.assertNotIn("<img", html)
+
+    def test_skill(self):
+        html = render_to_string("portfolio/blocks/skill_grid.html", {"value": {"image": None}, "index": 0})
+        self.assertNotIn("<img", html)
+
+        html = render_to_string("portfolio/blocks/skill_modal.html", {"skill": {"image": None}, "index": 0})
+        self.assertNotIn("img-fluid", html)
+
+
 class PortFolioHTMLTestCase(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -4,6 +4,7 @@ from django.utils import translation
 from django.utils.cache import add_never_cache_headers
 
 from folioblog.blog.models import BlogCategory, BlogPage, BlogPageTag, BlogTag
+from folioblog.core.cache import collect_listing
 from folioblog.core.models import BaseIndexPage, FolioBlogSettings
 from folioblog.core.pagination import FolioBlogPaginator
 from folioblog.search.form import SearchForm
@@ -47,6 +48,7 @@ class SearchIndexPage(BaseIndexPage):
             limit=folio_settings.search_limit,
             operator=folio_settings.search_operator,
         )
+        collect_listing(BlogPage, BlogTag, BlogCategory)
         search_counter = (
             search_results.paginator.count if has_filters and hasattr(search_results, "paginator") else None
         )  # noqa
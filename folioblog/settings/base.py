@@ -280,3 +280,38 @@ TAGGIT_CASE_INSENSITIVE = True
 
 FOLIOBLOG_COMPRESSOR_UGLIFY_BINARY = BASE_DIR / "node_modules" / "uglify-js" / "bin" / "uglifyjs"
 FOLIOBLOG_COMPRESSOR_UGLIFY_ARGUMENTS = ""
+
+# Same gallery order meanwhile, to be cached (0 to never change it).
+FOLIOBLOG_GALLERY_SHUFFLE_SECONDS = 24 * 60 * 60
+
+# Video thumbnails extracted in background (extractthumbnails command).
+FOLIOBLOG_VIDEO_THUMBNAIL_TIMEOUT = 10  # per network call, in seconds
+FOLIOBLOG_VIDEO_THUMBNAIL_MAX_ATTEMPTS = 5
+FOLIOBLOG_VIDEO_THUMBNAIL_RETRY_SECONDS = 60  # doubled on each attempt
+
+# Embeds refreshed in background before they expire (refreshembeds command).
+FOLIOBLOG_EMBED_REFRESH_SECONDS = 24 * 60 * 60
+FOLIOBLOG_EMBED_TIMEOUT = 10  # per provider call, in seconds
+
+# Live pages per category of index pages, maintained on publish/unpublish.
+FOLIOBLOG_CATEGORY_STATS_SECONDS = 24 * 60 * 60
+
+# Page cache, only enabled if CACHES is set.
+FOLIOBLOG_CACHE_STALE_SECONDS = 0
+FOLIOBLOG_CACHE_LOCK_SECONDS = 10
+FOLIOBLOG_CACHE_LOCK_WAIT_SECONDS = 5
+FOLIOBLOG_CACHE_COMPRESS_MIN_LENGTH = 1024  # None to disable it
+FOLIOBLOG_CACHE_COMPRESS_ENCODING = "gzip"  # gzip, deflate or zstd (if zstandard is installed)
+FOLIOBLOG_CACHE_LOCAL_MAX_ENTRIES = 0  # per process, 0 to disable it
+FOLIOBLOG_CACHE_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+FOLIOBLOG_CACHE_LOCAL_SECONDS = 5  # served by other processes until then, once invalidated
+FOLIOBLOG_CACHE_WARMUP_QUEUE = False  # queue evicted pages for loadcachepages --incremental
+FOLIOBLOG_CACHE_WARMUP_PRIORITIES = {  # loadcachepages order per kind of URLs, after access log hits if any
+    "queue": 50,
+    "page": 40,
+    "pagination": 30,
+    "category": 20,
+    "collection": 10,
+    "view": 0,
+    "404": 0,
+}
@@ -0,0 +1,46 @@
+from datetime import timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.utils import timezone
+
+from wagtail.embeds.exceptions import EmbedNotFoundException
+from wagtail.embeds.finders.base import EmbedFinder
+
+
+class StubEmbedFinder(EmbedFinder):
+    """
+    Local oEmbed provider returning YouTube like embeds without any network
+    call (i.e: for testing), enabled with:
+
+    WAGTAILEMBEDS_FINDERS = [{"class": "folioblog.video.finders", "cache_age": 3600}]
+    """
+
+    def __init__(self, cache_age=None, **options):
+        self.cache_age = cache_age
+
+    def accept(self, url):
+        return True
+
+    def find_embed(self, url, max_width=None, max_height=None):
+        video_id = parse_qs(urlparse(url).query).get("v", [""])[0]
+        if not video_id:
+            raise EmbedNotFoundException
+
+        width, height = max_width or 480, max_height or 270
+        src = f"https://www.youtube.com/embed/{video_id}"
+        embed = {
+            "title": f"Video {video_id}",
+            "author_name": "Stub",
+            "provider_name": "YouTube",
+            "type": "video",
+            "thumbnail_url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+            "width": width,
+            "height": height,
+            "html": f'<iframe width="{width}" height="{height}" src="{src}"></iframe>',
+        }
+        if self.cache_age is not None:
+            embed["cache_until"] = timezone.now() + timedelta(seconds=self.cache_age)
+        return embed
+
+
+embed_finder_class = StubEmbedFinder
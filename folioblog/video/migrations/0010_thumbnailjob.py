@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("video", "0009_alter_videopage_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThumbnailJob",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("scheduled_at", models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                (
+                    "page",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="thumbnail_job", to="video.videopage"
+                    ),
+                ),
+            ],
+        ),
+    ]
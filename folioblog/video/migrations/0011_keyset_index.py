@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0022_imageusage"),
+        ("video", "0010_thumbnailjob"),
+        ("wagtailcore", "0093_uploadedfile"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="videopage",
+            index=models.Index(fields=["-date", "-page_ptr"], name="video_videopage_keyset_idx"),
+        ),
+    ]
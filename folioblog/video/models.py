@@ -4,14 +4,18 @@ from io import BytesIO
 from django.core.files.images import ImageFile
 from django.db import models
 from django.db.models import Prefetch
+from django.utils import timezone
 from django.utils.functional import cached_property
+from django.utils.translation import get_language
 
 from wagtail.admin.panels import FieldPanel, InlinePanel, MultiFieldPanel
 from wagtail.api import APIField
 from wagtail.embeds import embeds
+from wagtail.embeds.embeds import get_embed_hash
 from wagtail.embeds.exceptions import EmbedException
+from wagtail.embeds.models import Embed
 from wagtail.images import get_image_model
-from wagtail.models import Collection, Orderable, Page, TranslatableMixin
+from wagtail.models import Collection, Orderable, Page, Revision, TranslatableMixin
 from wagtail.search import index
 
 import requests
@@ -20,6 +24,8 @@ from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
 from taggit.models import TagBase, TaggedItemBase
 
+from folioblog.core.cache import collect_listing
+from folioblog.core.categories import get_category_stats
 from folioblog.core.managers import I18nMultiSiteManager
 from folioblog.core.models import (
     BaseCategory,
@@ -36,6 +42,10 @@ logger = logging.getLogger(__name__)
 
 class VideoIndexPage(BaseIndexPage):
     ajax_template = "video/video_index_grid_item.html"
+    cache_query_params = ["ajax", "category", "page", "after"]
+
+    category_page_model = "video.VideoPage"
+    category_hide_empty = True
 
     subpage_types = ["video.VideoPage"]
 
@@ -43,15 +53,9 @@ class VideoIndexPage(BaseIndexPage):
         folio_settings = FolioBlogSettings.for_request(request)
         context = super().get_context(request, *args, **kwargs)
 
-        categories = (
-            VideoCategory.objects.in_site(folio_settings.site)
-            .filter(videopages__isnull=False)
-            .filter_language()
-            .order_by("slug")
-            .distinct()
-        )
-        context["categories"] = categories
-        context["category_filters"] = [{"name": str(c), "value": c.slug} for c in categories]
+        stats = get_category_stats(self, folio_settings.site_id, get_language())
+        context["categories"] = stats["categories"]
+        context["category_filters"] = [{"name": c["name"], "value": c["value"]} for c in stats["categories"]]
         context["category_query"] = request.GET.get("category", "")
 
         qs = (
@@ -71,9 +75,14 @@ class VideoIndexPage(BaseIndexPage):
         )
         if request.GET.get("category"):
             qs = qs.filter(category__slug=request.GET["category"])
+        collect_listing(VideoPage)
 
         paginator = FolioBlogPaginator(qs, folio_settings.video_pager_limit)
-        context["videos"] = paginator.get_page(request.GET.get("page"))
+        context["videos"], context["next_after"] = paginator.get_page_after(
+            request.GET.get("page"),
+            request.GET.get("after"),
+        )
+        VideoPage.resolve_embeds(context["videos"])
 
         return context
 
@@ -162,6 +171,11 @@ class VideoPage(BasePage):
     parent_page_types = ["video.VideoIndexPage"]
     subpage_types = []
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date", "-page_ptr"], name="video_videopage_keyset_idx"),
+        ]
+
     @cached_property
     def video_id(self):
         # For now, keep it simple, stupid!
@@ -175,14 +189,36 @@ class VideoPage(BasePage):
         except EmbedException as exc:
             logger.exception(f"Embed error for page {self.pk} with src {self.video_url} and error msg: {exc}")
 
+    @classmethod
+    def resolve_embeds(cls, pages):
+        """
+        Attach embeds of pages at once, instead of one query per page. Missing
+        or expired ones are still fetched later, on demand.
+        """
+        hashes = {p.pk: get_embed_hash(p.video_url) for p in pages if "embed" not in p.__dict__}
+        if not hashes:
+            return
+
+        embeds_qs = Embed.objects.exclude(cache_until__lte=timezone.now())
+        embeds_by_hash = embeds_qs.in_bulk(hashes.values(), field_name="hash")
+        for page in pages:
+            if hashes.get(page.pk) in embeds_by_hash:
+                page.embed = embeds_by_hash[hashes[page.pk]]  # Override the cached property.
+
     def save_revision(self, *args, **kwargs):
-        if self.thumbnail is None:
-            self.thumbnail = self.extract_thumbnail()
-        return super().save_revision(*args, **kwargs)
+        revision = super().save_revision(*args, **kwargs)
+        # Extracted later by a worker (extractthumbnails), to keep saves fast.
+        # Requeued from scratch, even if given up before (i.e: new video).
+        if self.thumbnail_id is None:
+            ThumbnailJob.objects.update_or_create(page=self, defaults={"attempts": 0, "scheduled_at": timezone.now()})
+        return revision
+
+    def extract_thumbnail(self, collection=None, timeout=None):
+        if self.embed is None:
+            return
 
-    def extract_thumbnail(self):
         try:
-            r = requests.get(self.embed.thumbnail_url)
+            r = requests.get(self.embed.thumbnail_url, timeout=timeout)
         except requests.RequestException as exc:
             logger.exception(f"Error thumbnail for page {self.pk} with exc: {exc}")
             return
@@ -199,11 +235,38 @@ class VideoPage(BasePage):
                 file=BytesIO(r.content),
                 name=f"thumbnail-{self.video_id}.{ext}",
             ),
-            collection=Collection.objects.get(name="Video thumbnail"),
+            collection=collection or Collection.objects.get(name="Video thumbnail"),
         )
         thumbnail.save()
         return thumbnail
 
+    def attach_thumbnail(self, thumbnail):
+        """
+        Attach the thumbnail to the page and to its latest and live revisions,
+        without creating a new one.
+        """
+        self.thumbnail = thumbnail
+        self.save(clean=False)
+
+        revisions = Revision.objects.filter(pk__in=[self.latest_revision_id, self.live_revision_id])
+        for revision in revisions:
+            if not revision.content.get("thumbnail"):
+                revision.content["thumbnail"] = thumbnail.pk
+                revision.save(update_fields=["content"])
+
+
+class ThumbnailJob(models.Model):
+    """
+    Queue of video pages waiting for their thumbnail.
+    """
+
+    page = models.OneToOneField(VideoPage, on_delete=models.CASCADE, related_name="thumbnail_job")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    scheduled_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return str(self.page)
+
 
 class VideoPageRelatedLink(Orderable):
     page = ParentalKey(VideoPage, related_name="related_links")
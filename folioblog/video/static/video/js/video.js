@@ -5,9 +5,19 @@
     let grid = document.querySelector('#videos-container');
     let filters = document.querySelector('#filters-dropdown');
     let infScroll;
+    let nextAfter = null;
+
+    function readNextAfter(elem) {
+        // Position of the next items if any, given by the server.
+        let marker = elem.querySelector('[data-next-after]');
+        nextAfter = marker ? marker.getAttribute('data-next-after') : null;
+    }
 
     function getPath() {
-        let href = `?ajax=1&page=${this.pageIndex + 1}`;
+        if (!nextAfter) {
+            return;  // No more items.
+        }
+        let href = '?ajax=1&after=' + nextAfter;
         let cat = document.querySelector('#filters-dropdown .active').getAttribute('data-filter');
         if (cat !== '*') {
             href = href.concat('&category=', cat.substring('category-'.length));
@@ -25,11 +35,19 @@
     }
 
     function refreshLayout() {
-        infScroll.destroy(); // And yes, this is needed too!!
-        initLayout();
+        if (infScroll) {
+            infScroll.destroy(); // And yes, this is needed too!!
+            infScroll = null;
+        }
+        initInfiniteScroll();
     }
 
-    function initLayout() {
+    function initInfiniteScroll() {
+        readNextAfter(grid);
+        if (!nextAfter) {
+            return;
+        }
+
         infScroll = new InfiniteScroll(grid, {
             path: getPath,
             append: '.video-item',
@@ -37,14 +55,19 @@
             status: '.page-load-status',
             hideNav: '.pagination'
         });
+        infScroll.on('load', readNextAfter);
         // Bind event "append" to interact when all items are displayed.
         infScroll.on('append', appendItemsFinished);
+    }
+
+    function initLayout() {
+        initInfiniteScroll();
 
         // Bind click event on filter to refresh the grid.
         filters.addEventListener('click', function (event) {
             event.preventDefault();
 
-            let url = '?ajax=1&page=1';
+            let url = '?ajax=1';
             let category = event.target.getAttribute('data-filter');
             if (category !== '*') {
                 url = url + '&category=' + category.substring('category-'.length);
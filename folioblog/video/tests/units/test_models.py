@@ -1,4 +1,12 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from wagtail.embeds.exceptions import EmbedException
+from wagtail.embeds.models import Embed
+from wagtail.images.tests.utils import get_test_image_file
 
 import requests
 import requests_mock
@@ -6,7 +14,7 @@ from wagtail_factories import CollectionFactory
 
 from folioblog.core.factories import ImageFactory
 from folioblog.video.factories import VideoIndexPageFactory, VideoPageFactory
-from folioblog.video.models import VideoPage
+from folioblog.video.models import ThumbnailJob, VideoPage
 
 
 class VideoPageModelTestCase(TestCase):
@@ -43,25 +51,107 @@ class VideoPageModelTestCase(TestCase):
 
     @requests_mock.Mocker()
     def test_thumbnail_request_exception(self, m):
-        page = VideoPageFactory(parent=self.index, embed__skip=True, thumbnail=None)
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
         m.get(page.embed.thumbnail_url, exc=requests.exceptions.HTTPError)
 
         with self.assertLogs("folioblog.video.models", level="ERROR") as cm:
-            page.save_revision()
+            self.assertIsNone(page.extract_thumbnail())
         self.assertIn("Error thumbnail", cm.output[0])
-        self.assertFalse(page.thumbnail)
 
     @requests_mock.Mocker()
     def test_thumbnail_request_bad_status(self, m):
-        page = VideoPageFactory(parent=self.index, embed__skip=True, thumbnail=None)
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
         m.get(page.embed.thumbnail_url, status_code=400)
 
         with self.assertLogs("folioblog.video.models", level="WARNING") as cm:
-            page.save_revision()
+            self.assertIsNone(page.extract_thumbnail())
         self.assertIn("Bad status", cm.output[0])
+
+    @requests_mock.Mocker()
+    def test_thumbnail_request_timeout(self, m):
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
+        m.get(page.embed.thumbnail_url, content=get_test_image_file().file.getvalue())
+
+        thumbnail = page.extract_thumbnail(timeout=5)
+        self.assertEqual(m.last_request.timeout, 5)
+        self.assertEqual(thumbnail.collection, self.collection)
+
+    def test_thumbnail_embed_failed(self):
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
+        with mock.patch("folioblog.video.models.embeds.get_embed", side_effect=EmbedException):
+            with self.assertLogs("folioblog.video.models", level="ERROR"):
+                self.assertIsNone(page.extract_thumbnail())
+
+    def test_thumbnail_queued(self):
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
+        with mock.patch.object(VideoPage, "extract_thumbnail") as mock_extract:
+            page.save_revision()
+            page.save_revision()
+        mock_extract.assert_not_called()
         self.assertFalse(page.thumbnail)
+        self.assertEqual(ThumbnailJob.objects.filter(page=page).count(), 1)
+
+    def test_thumbnail_requeued(self):
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
+        ThumbnailJob.objects.create(page=page, attempts=5, scheduled_at=timezone.now() + timedelta(days=1))
+
+        page.save_revision()
+        job = ThumbnailJob.objects.get(page=page)
+        self.assertEqual(job.attempts, 0)
+        self.assertLessEqual(job.scheduled_at, timezone.now())
+
+    def test_thumbnail_not_queued(self):
+        page = VideoPageFactory(parent=self.index)
+        page.save_revision()
+        self.assertFalse(ThumbnailJob.objects.filter(page=page).exists())
 
     def test_thumbnail_attach(self):
-        page = VideoPageFactory(parent=self.index, embed__skip=True, thumbnail=None)
+        page = VideoPageFactory(parent=self.index, thumbnail=None)
+        page.save_revision().publish()
+        page.title = "draft"
         page.save_revision()
-        self.assertTrue(page.thumbnail)
+
+        image = ImageFactory()
+        page = VideoPage.objects.get(pk=page.pk)
+        page.attach_thumbnail(image)
+
+        page.refresh_from_db()
+        self.assertEqual(page.thumbnail, image)
+        self.assertEqual(page.title, page.live_revision.as_object().title)
+        self.assertEqual(page.live_revision.as_object().thumbnail, image)
+        self.assertEqual(page.latest_revision.as_object().thumbnail, image)
+        self.assertEqual(page.latest_revision.as_object().title, "draft")
+
+
+class VideoPageResolveEmbedsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.index = VideoIndexPageFactory()
+        cls.pages = VideoPageFactory.create_batch(3, parent=cls.index)
+
+    def test_resolve(self):
+        pages = list(VideoPage.objects.filter(pk__in=[p.pk for p in self.pages]))
+        with self.assertNumQueries(1):
+            VideoPage.resolve_embeds(pages)
+            for page in pages:
+                self.assertEqual(page.embed.url, page.video_url)
+
+    def test_resolve_none(self):
+        with self.assertNumQueries(0):
+            VideoPage.resolve_embeds([])
+
+    def test_resolve_already_loaded(self):
+        page = VideoPage.objects.get(pk=self.pages[0].pk)
+        page.embed
+        with self.assertNumQueries(0):
+            VideoPage.resolve_embeds([page])
+
+    def test_resolve_missing(self):
+        page = VideoPage.objects.get(pk=self.pages[0].pk)
+        Embed.objects.filter(url=page.video_url).update(cache_until=timezone.now())
+
+        VideoPage.resolve_embeds([page])
+        self.assertNotIn("embed", page.__dict__)
+        with mock.patch("folioblog.video.models.embeds.get_embed") as mock_embed:
+            page.embed
+        mock_embed.assert_called_once_with(page.video_url)